@@ -0,0 +1,157 @@
+import json
+import signal
+import sys
+import threading
+from collections import deque
+
+from pywaybackup.PyWayBackup import PyWayBackup
+from pywaybackup.Worker import WorkerPool
+
+
+class Batch:
+    """
+    Several jobs run in one process, taking turns (batch).
+
+    Each job is given as the arguments of `PyWayBackup`, missing ones are taken
+    from `defaults`. The jobs run one after another - the job database and the
+    logging are held by the process, not by a job - but each job downloads
+    `turn` snapshots and then hands over to the next one. A job with snapshots
+    left stays loaded and continues with its next turn where it paused, so a
+    large site does not hold back the small ones behind it and is not queried
+    and loaded again for every turn. A job which made no progress in its turn
+    (e.g. archive.org refused all its snapshots) is not continued, it stays
+    resumable as any interrupted job.
+
+    Every job has its own output, metadata and progress. The workers with
+    their connections (see `WorkerPool`) and the requests per second (`rate`,
+    see `RateLimit`) are shared by all jobs, so the batch keeps to one budget
+    towards archive.org however many jobs it holds. Jobs writing the same job database (same url and metadata
+    directory) do not take turns with each other, the later one waits until
+    the earlier one finished.
+
+    Attributes:
+        jobs (list): Arguments of each job.
+        defaults (dict): Arguments for all jobs.
+        turn (int): Snapshots a job downloads before the next one takes over, 0 to run each job to its end.
+    """
+
+    MODES = ("all", "last", "first", "save")
+
+    def __init__(self, jobs: list, defaults: dict = None, turn: int = 100):
+        self.jobs = jobs
+        self.defaults = {key: value for key, value in (defaults or {}).items() if key not in ("batch", "batch_turn")}
+        self.turn = turn
+        self._stopped = False
+        self._pool = WorkerPool()
+
+    @staticmethod
+    def read(path: str) -> list:
+        """
+        Read the jobs of a batch file (`-` for stdin): a json object of arguments or a url per line.
+        Empty lines and lines starting with `#` are skipped.
+
+        Returns:
+            list: Arguments of each job.
+        """
+        handle = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+        try:
+            jobs = []
+            for number, line in enumerate(handle, start=1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("{"):
+                    try:
+                        jobs.append(json.loads(line))
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"{path} line {number}: {e}") from e
+                else:
+                    jobs.append({"url": line})
+            return jobs
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+    def _arguments(self, job: dict) -> dict:
+        """
+        Arguments of a job, the mode of the job replaces the default one.
+        """
+        defaults = self.defaults
+        if any(job.get(mode) for mode in self.MODES):
+            defaults = {key: value for key, value in defaults.items() if key not in self.MODES}
+        return {**defaults, **job, "turn": self.turn}
+
+    def _write(self, content: str):
+        if not self.defaults.get("silent", True):
+            print(content)
+
+    def _interrupt(self, signum, frame):
+        self._stopped = True
+        raise KeyboardInterrupt
+
+    def run(self) -> dict:
+        """
+        Run all jobs until each of them finished or made no progress in its turn.
+
+        Returns:
+            dict: {'finished':, 'unfinished':, 'failed':} - the number of jobs.
+        """
+        # one entry per job: arguments, turns taken, snapshots handled after the last turn, the loaded job
+        queue = deque(
+            {"job": job, "id": i, "turns": 0, "handled": -1, "backup": None} for i, job in enumerate(self.jobs, start=1)
+        )
+        owners = {}  # job database -> entry downloading into it
+        result = {"finished": 0, "unfinished": 0, "failed": 0}
+        try:
+            while queue and not self._stopped:
+                entry = queue.popleft()
+                job = entry["job"]
+                label = job.get("url") or job.get("input")
+                database = (
+                    job.get("metadata", self.defaults.get("metadata")),
+                    job.get("output", self.defaults.get("output")),
+                    label,
+                )
+                if owners.setdefault(database, entry) is not entry:
+                    queue.append(entry)
+                    continue
+
+                entry["turns"] += 1
+                self._write(f"\n===== Batch: job {entry['id']}/{len(self.jobs)} - {label} - turn {entry['turns']}")
+                if threading.current_thread() is threading.main_thread():
+                    signal.signal(signal.SIGINT, self._interrupt)  # the jobs ignore it once they are done
+                try:
+                    if entry["backup"] is None:
+                        entry["backup"] = PyWayBackup(**self._arguments(job), pool=self._pool)
+                    backup = entry["backup"]
+                    backup.run()
+                    status = backup.status()
+                except KeyboardInterrupt:
+                    self._stopped = True
+                    queue.appendleft(entry)
+                    break
+                except Exception as e:
+                    self._write(f"Batch: job {entry['id']} failed - {e}")
+                    result["failed"] += 1
+                    del owners[database]
+                    continue
+
+                if self._stopped:
+                    queue.appendleft(entry)
+                    break
+                pending = status["current"] < status["total"]
+                if pending and self.turn and status["current"] > entry["handled"]:
+                    entry["handled"] = status["current"]
+                    queue.append(entry)
+                    continue
+                result["unfinished" if pending else "finished"] += 1
+                del owners[database]
+        finally:
+            self._pool.close()
+
+        result["unfinished"] += len(queue)
+        self._write(
+            f"\n===== Batch: {result['finished']} finished, {result['unfinished']} unfinished,"
+            f" {result['failed']} failed"
+        )
+        return result
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class ContentCache:
+    """
+    Bodies of downloaded snapshots, kept for later jobs on the same host (content cache).
+
+    Jobs on a site overlap - a full-domain job, a subdir job, a `--last` job -
+    and each fetched the captures the others already had. A capture never
+    changes, so its body is stored by its `url_archive` and a job finding it
+    here does not request it again. The bodies are files below `content/`,
+    an index in `content.db` keeps their size and last use. Once the cache
+    holds more than `limit` bytes, the least recently used bodies are removed
+    until `SHRINK` of the limit is left.
+
+    The connection is opened on first use, so an instance can be handed to
+    the process running the job. Several jobs may use the cache at the same
+    time. Shared by all workers, thread-safe.
+
+    Attributes:
+        path (str): Directory of the cache.
+        limit (int): Size of the cache in bytes.
+    """
+
+    # share of the limit left after an eviction, so not every put evicts again
+    SHRINK = 0.9
+
+    _SQL_CREATE = (
+        "CREATE TABLE IF NOT EXISTS content "
+        "(url TEXT PRIMARY KEY, name TEXT NOT NULL, content_type TEXT, size INTEGER NOT NULL, used REAL NOT NULL)"
+    )
+    _SQL_CREATE_INDEX = "CREATE INDEX IF NOT EXISTS idx_content_used ON content (used)"
+    _SQL_GET = "SELECT name, content_type FROM content WHERE url = ?"
+    _SQL_TOUCH = "UPDATE content SET used = ? WHERE url = ?"
+    _SQL_PUT = "INSERT OR REPLACE INTO content (url, name, content_type, size, used) VALUES (?, ?, ?, ?, ?)"
+    _SQL_SIZE = "SELECT COALESCE(SUM(size), 0) FROM content"
+    _SQL_OLDEST = "SELECT url, name, size FROM content ORDER BY used LIMIT 100"
+    _SQL_DELETE = "DELETE FROM content WHERE url = ?"
+
+    def __init__(self, path: str, limit: int):
+        self.path = path
+        self.limit = limit
+        self.hits = 0
+        self._size = None  # bytes held, as far as this job knows
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.join(self.path, "content"), exist_ok=True)
+            self._connection = sqlite3.connect(
+                os.path.join(self.path, "content.db"), timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._connection.execute(self._SQL_CREATE)
+            self._connection.execute(self._SQL_CREATE_INDEX)
+            self._size = self._connection.execute(self._SQL_SIZE).fetchone()[0]
+        return self._connection
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, "content", name[:2], name)
+
+    def get(self, url: str):
+        """
+        The stored body of a capture.
+
+        Returns:
+            tuple: The body and its Content-Type, None if the capture is not stored.
+        """
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(self._SQL_GET, (url,)).fetchone()
+            if row is None:
+                return None
+            connection.execute(self._SQL_TOUCH, (time.time(), url))
+        try:
+            with open(self._file(row[0]), "rb") as file:
+                data = file.read()
+        except OSError:
+            return None  # evicted by another job in the meantime
+        with self._lock:
+            self.hits += 1
+        return data, row[1]
+
+    def put(self, url: str, data: bytes, content_type: str = None):
+        """
+        Store the body of a capture, evicting the least recently used ones if the cache is full.
+        """
+        if not data or len(data) > self.limit:
+            return
+        name = hashlib.sha1(url.encode()).hexdigest()
+        file = self._file(name)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        temp = f"{file}.{os.getpid()}.{threading.get_ident()}"
+        with open(temp, "wb") as handle:
+            handle.write(data)
+        os.replace(temp, file)  # readers see the whole body or none
+        with self._lock:
+            connection = self._connect()
+            connection.execute(self._SQL_PUT, (url, name, content_type, len(data), time.time()))
+            self._size += len(data)
+            if self._size > self.limit:
+                self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection):
+        """
+        Remove the least recently used bodies until `SHRINK` of the limit is left.
+        """
+        self._size = connection.execute(self._SQL_SIZE).fetchone()[0]  # other jobs add to it as well
+        while self._size > self.limit * self.SHRINK:
+            rows = connection.execute(self._SQL_OLDEST).fetchall()
+            if not rows:
+                break
+            for url, name, size in rows:
+                connection.execute(self._SQL_DELETE, (url,))
+                try:
+                    os.remove(self._file(name))
+                except OSError:
+                    pass
+                self._size -= size
+                if self._size <= self.limit * self.SHRINK:
+                    break
+
+    def close(self):
+        """
+        Close the connection.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,75 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional, pip install pywaybackup[compression]
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, pip install pywaybackup[compression]
+    zstandard = None
+
+# decompressors by Content-Encoding, as far as available
+_FACTORIES = {
+    "gzip": lambda: zlib.decompressobj(zlib.MAX_WBITS | 16),
+    "x-gzip": lambda: zlib.decompressobj(zlib.MAX_WBITS | 16),
+}
+if brotli is not None:
+    _FACTORIES["br"] = brotli.Decompressor
+if zstandard is not None:
+    _FACTORIES["zstd"] = lambda: zstandard.ZstdDecompressor().decompressobj()
+
+
+class Decoder:
+    """
+    Decodes the Content-Encoding of a response body part by part as it arrives.
+
+    The downloads ask for the encodings in `ACCEPT` - gzip always, brotli and
+    zstd if their packages are installed. Html, css and js shrink several times
+    over the wire, the decoding runs while the rest of the body is still on its
+    way instead of on the whole buffer afterwards. The decoded body is the same
+    as decoding the whole buffer at once.
+
+    An identity or unknown encoding passes the body through (`active` is False).
+
+    Attributes:
+        encoding (str): The Content-Encoding of the response, lowercase.
+        active (bool): The body is decoded.
+    """
+
+    # Accept-Encoding of the downloads
+    ACCEPT = ", ".join(encoding for encoding in ("gzip", "br", "zstd") if encoding in _FACTORIES)
+
+    def __init__(self, encoding: str = None):
+        self.encoding = (encoding or "identity").strip().lower()
+        self._factory = _FACTORIES.get(self.encoding)
+        self.active = self._factory is not None
+        self._decoder = self._factory() if self.active else None
+
+    def decode(self, data: bytes) -> bytes:
+        """
+        Decode the next part of the body. Raises the error of the decompressor for invalid data.
+        """
+        if not self.active:
+            return data
+        if self.encoding == "br":
+            process = getattr(self._decoder, "process", None) or self._decoder.decompress
+            return process(data)
+        decoded = self._decoder.decompress(data)
+        # gzip allows several members in a row - zlib stops after the first
+        while self.encoding != "zstd" and self._decoder.eof and self._decoder.unused_data:
+            rest = self._decoder.unused_data.lstrip(b"\x00")  # padding after the last member
+            if not rest:
+                break
+            self._decoder = self._factory()
+            decoded += self._decoder.decompress(rest)
+        return decoded
+
+    def flush(self) -> bytes:
+        """
+        Return what the decompressor still holds at the end of the body.
+        """
+        if self.encoding not in ("gzip", "x-gzip"):
+            return b""
+        return self._decoder.flush()
@@ -0,0 +1,136 @@
+import threading
+import time
+from importlib.metadata import version
+
+from pywaybackup.Verbosity import Verbosity as vb
+
+
+class Health:
+    """
+    Shared view of the workers on whether archive.org is answering (circuit breaker).
+
+    Every attempt reports its outcome. After `threshold` failures in a row -
+    server errors or connection errors, from any worker - the circuit opens:
+    the workers stop claiming snapshots and one of them probes archive.org
+    with a single lightweight request every `interval` seconds (doubled per
+    failed probe up to `cap`). The first healthy probe closes the circuit and
+    all workers resume together.
+
+    While the circuit is open failures are blamed on the outage rather than
+    on the snapshot, so the download loop does not count them against its
+    attempts. Shared by all workers, thread-safe.
+
+    Attributes:
+        threshold (int): Failures in a row which open the circuit, 0 disables it.
+        interval (float): Seconds between the opening and the first probe.
+        cap (float): Upper bound of the seconds between two probes.
+    """
+
+    PROBE_PATH = "/web/"
+    HEADERS = {"User-Agent": f"bitdruid-python-wayback-downloader/{version('pywaybackup')}"}
+
+    def __init__(self, threshold: int, interval: float, cap: float = 300):
+        self.threshold = threshold
+        self.interval = max(interval, 1)
+        self.cap = cap
+        self._failures = 0
+        self._open = False
+        self._probing = False
+        self._probe_at = 0.0
+        self._probe_delay = self.interval
+        self._condition = threading.Condition()
+
+    @property
+    def open(self) -> bool:
+        """
+        bool: True while archive.org is considered unavailable.
+        """
+        return self._open
+
+    @staticmethod
+    def failed(status) -> bool:
+        """
+        Whether a response status tells archive.org is in trouble (server error or rate limit).
+        """
+        return isinstance(status, int) and (status >= 500 or status == 429)
+
+    def success(self):
+        """
+        Report an attempt which got an answer from archive.org.
+        """
+        with self._condition:
+            self._failures = 0
+
+    def failure(self) -> bool:
+        """
+        Report a failed attempt, opening the circuit once the threshold is reached.
+
+        Returns:
+            bool: True if the circuit is open - the failure is due to the outage.
+        """
+        if not self.threshold:
+            return False
+        with self._condition:
+            self._failures += 1
+            if not self._open and self._failures >= self.threshold:
+                self._open = True
+                self._probe_delay = self.interval
+                self._probe_at = time.monotonic() + self._probe_delay
+                vb.write(
+                    verbose=None,
+                    content=(
+                        f"\n-----> archive.org unavailable - {self._failures} failures in a row"
+                        f" - pausing all workers, checking again in {self._probe_delay:.0f} seconds"
+                    ),
+                )
+            return self._open
+
+    def wait(self, worker):
+        """
+        Return at once if the circuit is closed, otherwise block until it closes.
+
+        One waiting worker at a time sends the probe through its own connection
+        once it is due, the others sleep until the probe closes the circuit.
+        """
+        while True:
+            with self._condition:
+                if not self._open:
+                    return
+                due = self._probe_at - time.monotonic()
+                if self._probing or due > 0:
+                    self._condition.wait(timeout=None if self._probing else due)
+                    continue
+                self._probing = True
+            healthy = self._probe(worker)
+            with self._condition:
+                self._probing = False
+                if healthy:
+                    self._open = False
+                    self._failures = 0
+                    vb.write(verbose=None, content="\n-----> archive.org available again - resuming all workers")
+                else:
+                    self._probe_delay = min(self._probe_delay * 2, self.cap)
+                    self._probe_at = time.monotonic() + self._probe_delay
+                    vb.write(
+                        verbose=True,
+                        content=(
+                            f"\n-----> archive.org still unavailable - next check in {self._probe_delay:.0f} seconds"
+                        ),
+                    )
+                self._condition.notify_all()
+
+    def _probe(self, worker) -> bool:
+        """
+        Send a HEAD request through the connection of the worker.
+
+        Returns:
+            bool: True if archive.org answered without a server error.
+        """
+        try:
+            worker.connection.request("HEAD", self.PROBE_PATH, headers=self.HEADERS)
+            response = worker.connection.getresponse()
+            response.read()
+            return not self.failed(response.status)
+        except Exception:
+            worker.refresh_connection()
+            return False
@@ -0,0 +1,142 @@
+import bisect
+import queue
+import socket
+import threading
+import time
+from collections import deque
+
+
+class Hedge:
+    """
+    Duplicates requests which take longer than nearly all others (hedged requests).
+
+    Most snapshots arrive within a second or two, a few hang for half a minute
+    and keep the job from finishing long after everything else is done. A
+    request still unanswered after the `quantile` of the recent latencies is
+    sent again on a second connection. Whichever answers first is kept, the
+    other one is cancelled by shutting down its socket and its connection is
+    dropped - if the duplicate wins, the worker continues with its connection.
+
+    Duplicates are capped at `ratio` of all requests, so an archive.org slow
+    across the board is not hit twice as hard. Shared by all workers, thread-safe.
+
+    Attributes:
+        ratio (float): Upper bound of duplicates per request.
+        quantile (float): Share of recent requests answered before a request is duplicated.
+    """
+
+    # latencies kept to derive the threshold from
+    WINDOW = 500
+    # latencies needed before any request is duplicated
+    MIN_SAMPLES = 20
+
+    def __init__(self, ratio: float = 0.05, quantile: float = 0.95):
+        self.ratio = ratio
+        self.quantile = quantile
+        self.requests = 0
+        self.hedges = 0
+        self._latencies = deque(maxlen=self.WINDOW)
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def threshold(self):
+        """
+        Seconds after which a request is duplicated, None while too few requests were seen.
+        """
+        with self._lock:
+            if len(self._sorted) < self.MIN_SAMPLES:
+                return None
+            return self._sorted[int(len(self._sorted) * self.quantile)]
+
+    def observe(self, latency: float):
+        """
+        Record the latency of an answered request.
+        """
+        with self._lock:
+            if len(self._latencies) == self._latencies.maxlen:
+                del self._sorted[bisect.bisect_left(self._sorted, self._latencies[0])]
+            self._latencies.append(latency)
+            bisect.insort(self._sorted, latency)
+
+    def _allow(self) -> bool:
+        """
+        Take a duplicate from the budget if the cap is not reached.
+        """
+        with self._lock:
+            if self.hedges + 1 > self.requests * self.ratio:
+                return False
+            self.hedges += 1
+            return True
+
+    def fetch(self, worker, send):
+        """
+        Send a request through the connection of the worker, duplicated if it takes too long.
+
+        Args:
+            worker (Worker): The worker instance, `connection` is replaced if the duplicate wins.
+            send (callable): Sends the request through the given connection and returns its result.
+        Returns:
+            The result of `send` which came first. Raises the error of a
+            request if none succeeded.
+        """
+        with self._lock:
+            self.requests += 1
+        threshold = self.threshold()
+        start = time.monotonic()
+        if threshold is None:
+            result = send(worker.connection)
+            self.observe(time.monotonic() - start)
+            return result
+
+        results = queue.Queue()
+        connections = [worker.connection]
+        self._start(send, worker.connection, results)
+        try:
+            connection, result, error = results.get(timeout=threshold)
+        except queue.Empty:
+            if not self._allow():
+                connection, result, error = results.get()
+            else:
+                worker.message.store(
+                    verbose=True, result="HEDGE", content=f"no answer after {threshold:.1f}s, sending again"
+                )
+                connections.append(worker.connect())
+                self._start(send, connections[1], results)
+                connection, result, error = results.get()
+                if error is not None:
+                    connection, result, error = results.get()  # the other one may still succeed
+                for other in connections:
+                    if other is not connection:
+                        self._cancel(other)
+                worker.connection = connection
+        if error is not None:
+            raise error
+        self.observe(time.monotonic() - start)
+        return result
+
+    @staticmethod
+    def _start(send, connection, results: queue.Queue):
+        """
+        Run `send` on the connection in a thread, its outcome is put into `results`.
+        """
+
+        def run():
+            try:
+                results.put((connection, send(connection), None))
+            except Exception as e:
+                results.put((connection, None, e))
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @staticmethod
+    def _cancel(connection):
+        """
+        Abort a request still running on the connection. The connection is not used again.
+        """
+        sock = connection.sock
+        try:
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+            connection.close()
+        except Exception:
+            pass
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class NegativeCache:
+    """
+    Captures which failed to download, remembered across runs and jobs (negative cache).
+
+    A capture which answered 404 or an empty body answers the same the next
+    night. A capture whose attempts are used up is stored by its `url_archive`
+    with the class of the failure and the failures in a row (one per run, not
+    per attempt), in a sqlite file shared by all jobs. A job looks its
+    unhandled snapshots up before any of them is claimed (see
+    `SnapshotCollection._skip_dead`):
+
+    - missing (client error) and empty (200 without a body): skipped, the
+      snapshot gets the status of its failure
+    - error (server error): downloaded after all others, archive.org may have recovered
+
+    An entry counts for `ttl` days after its last failure, times its failures
+    in a row (up to `MAX_FACTOR`). A capture downloaded after all removes its
+    entry. Rate limits (429) are not the fault of the capture and not stored.
+
+    The connection is opened on first use, so an instance can be handed to
+    the process running the job. Shared by all workers, thread-safe.
+
+    Attributes:
+        path (str): The sqlite file of the cache.
+        ttl (float): Days a failure counts, 0 disables the cache.
+        force (bool): Download remembered captures anyway, their outcome is still stored.
+    """
+
+    FILENAME = "negative.db"
+    # upper bound of the failures in a row the ttl is multiplied by
+    MAX_FACTOR = 8
+    # lookups per query, below the sqlite limit of bound parameters
+    BATCH = 500
+
+    _SQL_CREATE = (
+        "CREATE TABLE IF NOT EXISTS negative "
+        "(url TEXT PRIMARY KEY, failure TEXT NOT NULL, status TEXT, count INTEGER NOT NULL, expires REAL NOT NULL)"
+    )
+    _SQL_LOOKUP = "SELECT url, failure, status, expires FROM negative WHERE url IN ({marks})"
+    _SQL_FAILED = (
+        "INSERT INTO negative (url, failure, status, count, expires) VALUES (?, ?, ?, 1, ?) "
+        "ON CONFLICT(url) DO UPDATE SET failure = excluded.failure, status = excluded.status, count = count + 1, "
+        "expires = ? + ? * min(count + 1, ?)"
+    )
+    _SQL_DELETE = "DELETE FROM negative WHERE url = ?"
+
+    def __init__(self, path: str, ttl: float = 7, force: bool = False):
+        self.path = path
+        self.ttl = ttl
+        self.force = force
+        self._known = set()  # urls of this job with an entry
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """
+        bool: True if failures are stored.
+        """
+        return bool(self.path and self.ttl > 0)
+
+    @staticmethod
+    def classify(status, empty: bool = False):
+        """
+        The failure class of a download outcome, None for a success or a failure not stored.
+        """
+        if status == 200:
+            return "empty" if empty else None
+        if not isinstance(status, int) or status == 429:
+            return None
+        if 400 <= status < 500:
+            return "missing"
+        if status >= 500:
+            return "error"
+        return None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._connection.execute(self._SQL_CREATE)
+        return self._connection
+
+    def lookup(self, urls: list) -> dict:
+        """
+        Look up the failures of the given captures.
+
+        Returns:
+            dict: url_archive -> (status, defer) of the captures to skip or (defer) to
+                download last. Empty if `force` is set.
+        """
+        if not self.enabled or not urls:
+            return {}
+        found = {}
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            for start in range(0, len(urls), self.BATCH):
+                batch = urls[start : start + self.BATCH]
+                sql = self._SQL_LOOKUP.format(marks=", ".join("?" * len(batch)))
+                for url, failure, status, expires in connection.execute(sql, batch):
+                    self._known.add(url)
+                    if expires > now and not self.force:
+                        found[url] = (status, failure == "error")
+        return found
+
+    def record(self, url: str, status, empty: bool = False):
+        """
+        Store the outcome of a download - a failure is added, a success removes an earlier failure.
+        """
+        if not self.enabled:
+            return
+        failure = self.classify(status, empty)
+        if failure is None:
+            if status == 200 and url in self._known:
+                with self._lock:
+                    self._connect().execute(self._SQL_DELETE, (url,))
+                    self._known.discard(url)
+            return
+        now, ttl = time.time(), self.ttl * 86400
+        with self._lock:
+            self._connect().execute(self._SQL_FAILED, (url, failure, str(status), now + ttl, now, ttl, self.MAX_FACTOR))
+            self._known.add(url)
+
+    def close(self):
+        """
+        Close the connection.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
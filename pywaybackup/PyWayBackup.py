@@ -1,6 +1,7 @@
 import multiprocessing
 import os
 import signal
+import hashlib
 import sys
 import threading
 import time
@@ -9,13 +10,18 @@ from typing import Callable, Optional, Union
 
 import pywaybackup.archive_save as archive_save
 from pywaybackup.archive_download import DownloadArchive
+from pywaybackup.ContentCache import ContentCache
 from pywaybackup.db import Database as db
 from pywaybackup.Exception import Exception as ex
-from pywaybackup.files import CDXfile, CDXquery, CSVfile
-from pywaybackup.helper import sanitize_filename
+from pywaybackup.files import CDXcache, CDXfile, CDXquery, CSVfile, InputFile, ManifestFile
+from pywaybackup.helper import cache_dir, sanitize_filename
+from pywaybackup.NegativeCache import NegativeCache
+from pywaybackup.RateLimit import RateLimit
 from pywaybackup.Url import Url
 from pywaybackup.SnapshotCollection import SnapshotCollection
+from pywaybackup.Timeouts import Timeouts
 from pywaybackup.Verbosity import Verbosity as vb
+from pywaybackup.Worker import WorkerPool
 
 
 class _Status:
@@ -30,9 +36,11 @@ class _Status:
         handled (int): The number of snapshots that have been processed so far.
         total (int): The total number of snapshots to be processed.
         progress (float): The progress of the backup process as a percentage.
+        queue (multiprocessing.Value): Downloaded snapshots waiting to be written, shared with a daemon process.
 
     Methods:
         status(): Returns a dictionary with the current status of the backup process.
+        count(): Counts the total and handled snapshots.
 
     """
 
@@ -42,23 +50,31 @@ class _Status:
         self.handled = 0
         self.total = 0
         self._progress = 0
+        self.queue = multiprocessing.Value("i", 0)
+
+    def count(self):
+        """
+        Counts the total and handled snapshots, kept by `status` once the job is done or paused.
+        """
+        if not self.sc:
+            self.sc = SnapshotCollection()
+        self.handled = self.sc.count_handled()
+        self.total = self.sc.count_total()
 
     @property
     def status(self):
         """
         Returns a dictionary with the current status of the backup process:
-            {'task':, 'current':, 'total':, 'progress':}
+            {'task':, 'current':, 'total':, 'progress':, 'queue':}
         """
-        if not self.sc:
-            self.sc = SnapshotCollection()
-        if self.task != "done":
-            self.handled = self.sc.count_handled()
-            self.total = self.sc.count_total()
+        if self.task not in ("done", "paused"):
+            self.count()
         return {
             "task": self.task,
             "current": self.handled,
             "total": self.total,
             "progress": f"{self.handled / self.total:.0%}" if self.total > 0 else "0",
+            "queue": self.queue.value,
         }
 
 
@@ -85,6 +101,8 @@ class PyWayBackup:
         limit (int): Limit the number of snapshots queried from the CDX API.
         filetype (str): Comma-separated list of filetypes to include (e.g., 'jpg,css,js').
         statuscode (str): Comma-separated list of HTTP status codes to include (e.g., '200,301').
+        input (str): File (`-` for stdin) listing the captures to download instead of querying the CDX API -
+            archive urls or timestamp and url, as text, csv or jsonl. `url` is then optional.
         output (str): Output path for downloaded files. Defaults to `./waybackup_snapshots`.
         metadata (str): Path to store metadata files (`cdx`, `db`, `csv`, etc.).
         verbose (bool): Enable verbose logging.
@@ -93,10 +111,36 @@ class PyWayBackup:
         no_redirect (bool): Disable handling redirects.
         no_merge_www (bool): Keep www and non-www snapshots in separate folders instead of merging them.
         retry (int): Retry attempts for failed downloads.
+        wait (int): Seconds before a failed snapshot is retried, doubled per attempt (default: 15).
+        timeout (int): Seconds to connect, to wait for the response and between two reads of it (default: 30).
+        deadline (int): Seconds for a whole download, 0 for none (default: 0).
+        min_rate (int): Abort downloads slower than this many bytes/s, 0 for none (default: 0).
+        split (int): Megabytes from which a snapshot is fetched in parallel ranges, 0 for never (default: 0).
+        hedge (bool): Send downloads slower than 95% of the recent ones again on a second connection.
+        order (str): Download order - cdx, size (smallest first), html (pages first), depth (shallowest first)
+            or newest (default: cdx).
+        circuit (int): Failures in a row which pause all workers until archive.org answers (default: 10, 0: never).
+        cache (str): Directory of the caches shared by all jobs (default: ~/.cache/pywaybackup).
+        dead_ttl (int): Days a capture which failed is skipped by later runs, 0 to always try (default: 7).
+        recheck (bool): Download captures which failed in earlier runs anyway.
+        content_cache (int): Megabytes of downloaded snapshots kept in the cache for later jobs, 0 for none
+            (default: 0).
+        cdx_ttl (int): Days a cdx result is kept in the cache to answer the same or narrower queries, 0 for none
+            (default: 0).
         workers (int): Number of download workers (default: 1).
+        postworkers (int): Number of threads writing the downloaded snapshots (default: 1, 0: written by the workers).
+        buffer (int): Megabytes of downloaded snapshots held for writing before the workers wait (default: 64).
         delay (int): Delay between download requests in seconds.
+        rate (float): Requests per second to archive.org, shared by all jobs of the process, 0 for none (default: 0).
+        turn (int): Snapshots to download before the job returns, the others are kept for the next run
+            (see `Batch`, default: 0, all).
+        pool (WorkerPool): Workers and their connections shared with other jobs of the process (see `Batch`).
         reset (bool): Reset job metadata (deletes `.cdx`/`.db`/`.csv` files).
         keep (bool): Retain all job metadata after completion.
+        sync (bool): Keep the job, a later run only downloads the captures newer than the last complete run
+            and writes a manifest of the files it added or changed.
+        memory (bool): Keep the job database in memory, written to disk only if the job is interrupted or kept.
+        compact (bool): Rewrite the csv from the database after the job, one row per snapshot.
         silent (bool): Suppress all output (for programmatic use).
         debug (bool): Enable debug mode.
         progress_callback (callable): Called with the status() dict on every task change and, during the
@@ -127,6 +171,7 @@ class PyWayBackup:
         limit: int = None,
         filetype: str = None,
         statuscode: str = None,
+        input: str = None,
         output: str = None,
         metadata: str = None,
         verbose: Union[bool, str, int] = None,
@@ -136,10 +181,30 @@ class PyWayBackup:
         no_merge_www: bool = False,
         retry: int = 0,
         workers: int = 1,
+        postworkers: int = 1,
+        buffer: int = 64,
         delay: int = 0,
+        rate: float = 0,
+        turn: int = 0,
+        pool: WorkerPool = None,
         wait: int = 15,
+        circuit: int = 10,
+        timeout: int = 30,
+        deadline: int = 0,
+        min_rate: int = 0,
+        split: int = 0,
+        hedge: bool = False,
+        order: str = "cdx",
+        cache: str = None,
+        dead_ttl: int = 7,
+        recheck: bool = False,
+        content_cache: int = 0,
+        cdx_ttl: int = 0,
         reset: bool = False,
         keep: bool = False,
+        sync: bool = False,
+        memory: bool = False,
+        compact: bool = False,
         silent: bool = True,
         debug: bool = False,
         progress_callback: Optional[Callable[[dict], None]] = None,
@@ -158,6 +223,7 @@ class PyWayBackup:
         self._limit = limit
         self._filetype = filetype
         self._statuscode = statuscode
+        self._input = input
         self._output = output
         self._metadata = metadata
         self._verbose = verbose
@@ -167,11 +233,31 @@ class PyWayBackup:
         self._merge_www = not no_merge_www
         self._retry = retry
         self._workers = workers
+        self._postworkers = postworkers
+        self._buffer = buffer
         self._delay = delay
+        self._rate = rate
+        self._turn = turn
+        self._pool = pool
         self._wait = wait
+        self._circuit = circuit
+        self._timeout = timeout
+        self._deadline = deadline
+        self._min_rate = min_rate
+        self._split = split
+        self._hedge = hedge
+        self._order = order
+        self._cache = cache
+        self._dead_ttl = dead_ttl
+        self._recheck = recheck
+        self._content_cache = content_cache
+        self._cdx_ttl = cdx_ttl
 
         self._reset = reset
         self._keep = keep
+        self._sync = sync
+        self._memory = memory
+        self._compact = compact
 
         # module exclusive
         self._silent = silent
@@ -184,7 +270,18 @@ class PyWayBackup:
         self.pywaybackup_process = None
         self._cdxfile = None
         self._csvfile = None
-
+        self._captures = None  # (timestamp, url_origin) given by `input`
+        self._input_faulty = 0
+        self._manifest = None
+        self._sync_from = None  # newest timestamp of the last complete run, if this run syncs
+        self._delta = False  # this run merges new captures into a complete job
+        self._negative = None
+        self._content = None
+        self._collection = None  # kept loaded between the turns of a job
+        self._downloader = None
+
+        # the job - listing (url, period, limit) and selection (mode, filters). The listing of a kept
+        # job is kept apart from it for other selections on the url (see `_prep_cdx`).
         self._query_identifier = (
             str(self._url)
             +
@@ -219,12 +316,14 @@ class PyWayBackup:
         """
         Verify correctness of input parameters.
         """
-        # url must be given
-        if not self._url:
+        # url must be given, unless the captures are
+        if not self._url and not self._input:
             raise ValueError("URL must be provided")
         # all, last, first, save are mutually exclusive
         if sum([self._all, self._last, self._first, self._save]) != 1:
             raise ValueError("Exactly one of --all, --last, --first, or --save is allowed")
+        if self._order not in SnapshotCollection.ORDERS:
+            raise ValueError(f"--order must be one of {', '.join(SnapshotCollection.ORDERS)}")
 
     def _setup(self):
         """
@@ -233,7 +332,19 @@ class PyWayBackup:
         Splits up the domain, subdirectory, and filename from the provided URL.
         Initializes output and metadata directories and prepares file paths for
         CDX, DB, and CSV files used for tracking snapshots and metadata.
-        """
+
+        Captures given by `input` are read here, the job is identified by them
+        and named after the host of the first one if no URL is given.
+        """
+        if self._input:
+            inputfile = InputFile(self._input)
+            self._captures = inputfile.captures()
+            self._input_faulty = inputfile.faulty
+            if not self._captures and not self._url:
+                raise ValueError(f"No captures found in {self._input}")
+            self._url = self._url or Url(self._captures[0][1]).domain_raw
+            digest = hashlib.sha1(repr(sorted(self._captures)).encode()).hexdigest()
+            self._query_identifier += f"input{digest}"
         self._url_parsed = Url(self._url, merge_www=self._merge_www)
         self._domain = self._url_parsed.domain_raw
         self._subdir = self._url_parsed.subdir
@@ -241,6 +352,7 @@ class PyWayBackup:
 
         self._output = os.path.join(os.getcwd(), "waybackup_snapshots") if not self._output else self._output
         self._metadata = self._metadata if self._metadata else self._output
+        self._cache = self._cache if self._cache else cache_dir()
 
         if self._all:
             self._mode = "all"
@@ -258,6 +370,7 @@ class PyWayBackup:
         self._cdxfile = os.path.join(self._metadata, f"{base_name}.cdx")
         self._dbfile = os.path.join(self._metadata, f"{base_name}.db")
         self._csvfile = os.path.join(self._metadata, f"{base_name}.csv")
+        self._manifest = os.path.join(self._metadata, f"{base_name}.manifest.csv")
         self._logfile = os.path.join(self._metadata, f"{base_name}.log") if self._log else None
         self._debugfile = os.path.join(self._metadata, "waybackup_error.log") if self._debug else None
 
@@ -271,28 +384,43 @@ class PyWayBackup:
         """
         self._cdxfile = CDXfile(self._cdxfile)
         self._csvfile = CSVfile(self._csvfile)
+        self._manifest = ManifestFile(self._manifest)
         # self._dbfile = File(self._dbfile)
 
         self._f_reset()
-        ex.init(debugfile=self._debugfile, output=self._output, command=self._command)
-        vb.init(logfile=self._logfile, silent=self._silent, verbose=self._verbose, progress=self._progress)
-        db.init(dbfile=self._dbfile, query_identifier=self._query_identifier)
+        self._attach()
+        if db.query_replaced:
+            self._cdxfile.remove()  # of the dropped selection, not necessarily a listing of this one
 
         vb.write(content=f"\n<<< python-wayback-machine-downloader v{version('pywaybackup')} >>>")
 
         self._cdxfile.create()
         self._csvfile.create()
 
+    def _attach(self, append: bool = False):
+        """
+        Hand the logging, exception handling and database of the process to this job.
+
+        Args:
+            append (bool): Continue the log of an earlier turn instead of starting it over.
+        """
+        ex.init(debugfile=self._debugfile, output=self._output, command=self._command)
+        vb.init(
+            logfile=self._logfile, silent=self._silent, verbose=self._verbose, progress=self._progress, append=append
+        )
+        db.init(dbfile=self._dbfile, query_identifier=self._query_identifier, memory=self._memory)
+
     def _f_reset(self):
         """
         Reset metadata files if the `reset` flag is set.
 
-        Deletes the existing `.cdx`, `.db`, and `.csv` files if they exist,
-        ensuring a fresh start for the backup job.
+        Deletes the existing `.cdx`, `.db`, `.csv` and `.manifest.csv` files if they
+        exist, ensuring a fresh start for the backup job.
         """
         if self._reset:
             self._cdxfile.remove()
             self._csvfile.remove()
+            self._manifest.remove()
             os.remove(self._dbfile) if os.path.exists(self._dbfile) else None
 
     def _f_keep(self):
@@ -300,10 +428,11 @@ class PyWayBackup:
         Retain or delete metadata files based on the `keep` flag.
 
         If `keep` is False, deletes the `.cdx`, `.db`, and `.csv` files after
-        processing is complete.
+        processing is complete. With `sync` the `.db` file is kept for the next run.
         """
         if not self._keep:
-            os.remove(self._dbfile) if os.path.exists(self._dbfile) else None
+            if not self._sync:
+                os.remove(self._dbfile) if os.path.exists(self._dbfile) else None
             self._cdxfile.remove()
 
     def _prep_cdx(self) -> bool:
@@ -314,20 +443,37 @@ class PyWayBackup:
         retrieve snapshot information. Returns the CDXfile instance if the
         query is successful.
 
+        The cdx of a job with `keep` is kept as a listing of the url. A later
+        job whose query it covers - another mode, a subset of the filters, a
+        subdir - takes its snapshots from there (see `CDXcache`).
+
+        Not queried if the captures are given by `input`.
+
         Returns:
             bool: True if the CDX query was successful and snapshots were found, False otherwise.
         """
+        if self._captures is not None:
+            vb.write(content=f"\nCaptures given by {self._input} - no CDX query")
+            if self._input_faulty:
+                vb.write(content=f"{self._input_faulty} lines are no capture, skipped")
+            return True
         cdxquery = CDXquery(
             url=self._url,
-            range=self._range,
-            start=self._start,
+            range=None if self._sync_from else self._range,
+            start=self._sync_from or self._start,
             end=self._end,
             limit=self._limit,
             explicit=self._explicit,
             filter_filetype=self._filetype,
             filter_statuscode=self._statuscode,
         )
-        if self._cdxfile.request_snapshots(cdxquery):
+        cache = CDXcache(path=self._cache, ttl=self._cdx_ttl) if self._cdx_ttl > 0 else None
+        # listings of kept jobs in the metadata directory, a sync asks archive.org for what is new
+        listings = CDXcache(path=self._metadata, ttl=None, name="waybackup_listings", label="kept listing")
+        fresh = self._reset or self._delta
+        if self._cdxfile.request_snapshots(cdxquery, cache=cache, listings=None if fresh else listings):
+            if self._keep and not self._delta:
+                listings.store(cdxquery, self._cdxfile.filepath)
             return True
         return False
 
@@ -342,8 +488,21 @@ class PyWayBackup:
         Returns:
             SnapshotCollection: The initialized and loaded snapshot collection.
         """
+        self._negative = NegativeCache(
+            path=os.path.join(self._cache, NegativeCache.FILENAME), ttl=self._dead_ttl, force=self._recheck
+        )
         collection = SnapshotCollection()
-        collection.load(mode=self._mode, cdxfile=self._cdxfile, csvfile=self._csvfile, merge_www=self._merge_www)
+        collection.load(
+            mode=self._mode,
+            cdxfile=self._cdxfile,
+            csvfile=self._csvfile,
+            merge_www=self._merge_www,
+            output=self._output,
+            order=self._order,
+            dead=self._negative,
+            sync=self._sync,
+            captures=self._captures,
+        )
         collection.print_calculation()
         return collection
 
@@ -352,42 +511,70 @@ class PyWayBackup:
         Execute the download process using the SnapshotCollection.
 
         Initializes the download of the created SnapshotCollection with the current configuration
-        and uses it to download the snapshots represented in the collection.
+        and uses it to download the snapshots represented in the collection. The downloader is
+        created once and continues the collection with each turn of the job.
 
         Args:
             collection (SnapshotCollection): The snapshot collection to be downloaded.
         """
-        downloader = DownloadArchive(
+        if self._downloader is not None:
+            self._downloader.run(SnapshotCollection=collection)
+            return
+        if self._content_cache > 0:
+            self._content = ContentCache(path=self._cache, limit=self._content_cache * 1024 * 1024)
+        self._downloader = DownloadArchive(
             mode=self._mode,
             output=self._output,
             retry=self._retry,
             no_redirect=self._no_redirect,
             delay=self._delay,
             wait=self._wait,
+            circuit=self._circuit,
+            hedge=self._hedge,
+            split=self._split * 1024 * 1024,
+            dead=self._negative,
+            content=self._content,
+            replace=self._delta,
+            manifest=self._manifest if self._sync else None,
+            rate=RateLimit.shared(self._rate),
+            turn=self._turn,
+            pool=self._pool,
+            timeouts=Timeouts(
+                connect=self._timeout,
+                first_byte=self._timeout,
+                idle=self._timeout,
+                deadline=self._deadline,
+                min_rate=self._min_rate,
+            ),
             workers=self._workers,
+            postworkers=self._postworkers,
+            buffer=self._buffer * 1024 * 1024,
+            queue_depth=self._status.queue,
             merge_www=self._merge_www,
         )
-        downloader.run(SnapshotCollection=collection)
+        self._downloader.run(SnapshotCollection=collection)
 
     def _notify(self, task: str = None):
         """
-        Set the current task (if given) and push the status to the progress callback.
+        Set the current task (if given), count the snapshots and push the status to the progress callback.
 
         Never gated by `silent`/`progress` - those only control the tqdm bar, while
         embedders using the callback are exactly the ones running without one. A
         failing callback is logged and swallowed, it must not abort a running job.
+        The counts are taken without a callback as well, so `status()` after the
+        job reports them.
 
         Args:
             task (str, optional): New task name to set before notifying.
         """
         if task is not None:
             self._status.task = task
-        if not self._progress_callback:
-            return
         try:
-            self._progress_callback(self._status.status)
+            status = self._status.status
+            if self._progress_callback:
+                self._progress_callback(status)
         except Exception as e:
-            ex.exception(message="\nprogress_callback raised", e=e)
+            ex.exception(message="\nstatus update raised", e=e)
 
     def _notify_loop(self, stop: threading.Event):
         """
@@ -410,21 +597,28 @@ class PyWayBackup:
             3. Execute the download process using the collection.
 
         Handles exceptions and ensures proper cleanup and finalization of
-        resources after the backup is complete.
+        resources after the backup is complete. With a `turn`, a job with
+        snapshots left is suspended instead and the next run continues its
+        loaded collection without querying and loading it again.
 
         """
         collection = None
         ticker = None
         ticker_stop = threading.Event()
         try:
-            self._startup()
+            if self._collection:
+                collection = self._continue()
+                cdx = True
+            else:
+                self._startup()
 
-            self._notify(task="downloading cdx")
-            cdx = self._prep_cdx()
+                self._notify(task="downloading cdx")
+                cdx = self._prep_cdx()
 
             if cdx:
-                self._notify(task="preparing snapshots")
-                collection = self._prep_collection()
+                if not collection:
+                    self._notify(task="preparing snapshots")
+                    collection = self._prep_collection()
 
                 if collection:
                     self._notify(task="downloading snapshots")
@@ -432,17 +626,27 @@ class PyWayBackup:
                         ticker = threading.Thread(target=self._notify_loop, args=(ticker_stop,), daemon=True)
                         ticker.start()
                     self._dl_download(collection=collection)
+                    self._collection = None
+                    if self._turn and collection.count_unhandled() > 0:
+                        self._collection = collection  # the rest is downloaded by the next turn
+                    if self._sync:
+                        self._sync_finish(collection)
 
         except KeyboardInterrupt:
             self._keep = True
+            self._collection = None
             vb.write(content="\nInterrupted by user\n")
         except Exception as e:
             self._keep = True
+            self._collection = None
             ex.exception(message="", e=e)
         finally:
             ticker_stop.set()  # stop ticking before the db teardown below
             if ticker:
                 ticker.join()
+            if self._collection:
+                self._suspend()
+                return
             self._notify()  # last frame before "done" freezes the counts
             # if a collection was created during the workflow, close its DB session cleanly
             try:
@@ -455,7 +659,7 @@ class PyWayBackup:
     def paths(self, rel: bool = False) -> dict:
         """
         Return a dictionary of existing file paths associated to the backup process:
-            {'shapshots':, 'cdxfile':, 'dbfile':, 'csvfile':, 'log':, 'debug':}
+            {'shapshots':, 'cdxfile':, 'dbfile':, 'csvfile':, 'manifest':, 'log':, 'debug':}
 
         Example:
         >>> backup_paths = backup.paths(rel=True)
@@ -465,6 +669,7 @@ class PyWayBackup:
         ... 'cdxfile': 'waybackup_snapshots/waybackup_example.com.cdx',
         ... 'dbfile': 'waybackup_snapshots/waybackup_example.com.db',
         ... 'csvfile': 'waybackup_snapshots/waybackup_example.com.csv',
+        ... 'manifest': 'waybackup_snapshots/waybackup_example.com.manifest.csv',
         ... 'log': 'waybackup_snapshots/waybackup_example.com.log',
         ... 'debug': 'waybackup_snapshots/waybackup_error.log'
         ... }
@@ -474,6 +679,7 @@ class PyWayBackup:
             "cdxfile": self._cdxfile.filepath,
             "dbfile": self._dbfile,
             "csvfile": self._csvfile.filepath,
+            "manifest": self._manifest.filepath,
             "log": self._logfile,
             "debug": self._debugfile,
         }
@@ -486,7 +692,9 @@ class PyWayBackup:
     def status(self) -> dict:
         """
         Return the current status of the backup process by a dictionary:
-            {'task':, 'current':, 'total':, 'progress':}
+            {'task':, 'current':, 'total':, 'progress':, 'queue':}
+
+        `queue` is the number of downloaded snapshots waiting to be written.
 
         Example:
         >>> print(backup.status())
@@ -494,7 +702,8 @@ class PyWayBackup:
         ... 'task': 'downloading snapshots',
         ... 'current': 150,
         ... 'total': 300,
-        ... 'progress': '50%'
+        ... 'progress': '50%',
+        ... 'queue': 3
         ... }
         """
         return self._status.status
@@ -520,6 +729,14 @@ class PyWayBackup:
             archive_save.save_page(self._url)
 
         else:
+            if daemon and self._memory:
+                # the spawned process would keep its own copy of the database, invisible to status() and stop()
+                vb.write(
+                    verbose=True, content="\n--memory is not shared with run(daemon=True), using the database file"
+                )
+                self._memory = False
+                db.close_engine()
+                db.init(dbfile=self._dbfile, query_identifier=self._query_identifier)
             self.pywaybackup_process = multiprocessing.Process(target=self._workflow, daemon=True)
             if daemon:
                 self.pywaybackup_process.start()
@@ -548,14 +765,60 @@ class PyWayBackup:
             return True
         return False
 
+    def _sync_start(self) -> bool:
+        """
+        Prepare a run with `sync`.
+
+        A job whose last run handled all snapshots is synced: the cdx is queried
+        again from the newest timestamp of that run on, the insertion and the
+        filter run again to merge the new captures into the job and the manifest
+        is started over. An interrupted sync continues with the newest timestamp
+        it started from.
+
+        Returns:
+            bool: True if this run starts a sync of a complete job.
+        """
+        database = db()
+        newest, complete = database.get_sync()
+        if complete is not None:
+            self._sync_from = newest or self._start
+            self._delta = True
+        if complete == 1:
+            database.set_sync(complete=0)
+            database.reset_phases()
+        database.close()
+        if complete == 1 or not db.query_exist:
+            with self._manifest as f:
+                f.write_rows(list(f.COLUMNS))  # started over, empty if nothing changes
+        if complete != 1:
+            return False
+        self._cdxfile.remove()
+        self._cdxfile.create()
+        vb.write(content=f"\nSYNC job exist - querying captures since {newest}")
+        return True
+
+    def _sync_finish(self, collection: SnapshotCollection):
+        """
+        Mark the job complete if this run handled all snapshots, so the next run with `sync` queries the new
+        captures only. Reports the files the run added or changed.
+        """
+        if collection.count_unhandled() > 0:
+            return
+        collection.db.set_sync(complete=1)
+        counts = self._manifest.counts()
+        vb.write(content=f"\n{'added'.ljust(12)}: {counts['added']}")
+        vb.write(content=f"{'changed'.ljust(12)}: {counts['changed']}")
+
     def _startup(self):
+        if self._sync and self._sync_start():
+            return
         if db.query_exist:
             self._notify(task="resuming")
             vb.write(
                 content=f"\nDOWNLOAD job exist - processed: {db.query_progress}\nResuming download... (to reset the job use '--reset')"
             )
 
-            if not self._silent:
+            if not self._silent and not self._turn:
                 for i in range(5, -1, -1):
                     vb.write(content=f"\r{i}...")
                     print("\033[F", end="")
@@ -563,12 +826,52 @@ class PyWayBackup:
 
                     time.sleep(1)
 
+    def _continue(self) -> SnapshotCollection:
+        """
+        Take up the collection of a job suspended after its last turn.
+
+        Returns:
+            SnapshotCollection: The collection, as the last turn left it.
+        """
+        self._attach(append=True)
+        self._status.sc = None  # the session of the last turn is closed
+        self._notify(task="resuming")
+        collection = self._collection
+        collection.reopen()
+        vb.write(content=f"\nDOWNLOAD job continued - processed: {db.query_progress}")
+        return collection
+
+    def _suspend(self):
+        """
+        End a turn of a job with snapshots left. The collection and the downloader stay loaded for
+        the next turn, everything else is written as for a kept job - the job is resumable as it is
+        if no turn follows.
+        """
+        self._collection.close()  # unlocks the retries of the turn, the counts leave them out
+        self._csvfile.flush()
+        self._manifest.flush()
+        self._status.count()
+        self._notify(task="paused")
+        db.save()
+        db.close_engine()
+        vb.fini()
+
     def _shutdown(self):
         self._notify(task="done")  # counts stay frozen at the last live update
         collection = SnapshotCollection()
         collection.close()
-        self._csvfile.store_result()
+        if self._compact:
+            self._csvfile.store_result()
+        else:
+            self._csvfile.flush()
+        self._manifest.flush()
+        if self._keep or self._sync:
+            db.save()
         db.close_engine()
+        if self._negative is not None:
+            self._negative.close()
+        if self._content is not None:
+            self._content.close()
         self._f_keep()
         vb.fini()
         signal.signal(signal.SIGINT, signal.SIG_IGN)
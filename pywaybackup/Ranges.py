@@ -0,0 +1,177 @@
+import re
+import threading
+
+# Content-Range of a partial response: "bytes <first>-<last>/<total>"
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class Ranges:
+    """
+    Fetches snapshots by byte ranges - large ones split, interrupted ones resumed.
+
+    - split: a snapshot with a cdx length of at least `threshold` bytes starts
+      with a request for its first `HEAD` bytes. The total size from its
+      Content-Range is divided into `parts` ranges fetched at the same time on
+      pooled connections, so a large file is not bound to a single connection.
+    - resume: the body received before an interrupted attempt (`Snapshot.partial`)
+      is continued from its last byte instead of fetched again.
+
+    Ranges are requested without Content-Encoding, parts of an encoded body
+    could not be decoded one by one. A server ignoring the Range header
+    answers 200 with the whole body, which is taken as is. If a part fails, the contiguous start of the body is kept
+    on the error (as `partial`, like `http.client.IncompleteRead`) for the retry.
+    Shared by all workers, thread-safe.
+
+    Attributes:
+        threshold (int): Cdx length in bytes from which a snapshot is split, 0 to never split.
+        parts (int): Ranges of a split snapshot fetched at the same time.
+    """
+
+    # first request of a split snapshot, tells the total size
+    HEAD = 1024 * 1024
+    # bodies of interrupted attempts worth resuming
+    MIN_RESUME = 256 * 1024
+    # the byte positions are those of the stored file
+    IDENTITY = {"Accept-Encoding": "identity"}
+
+    def __init__(self, threshold: int = 0, parts: int = 4):
+        self.threshold = threshold
+        self.parts = max(parts, 1)
+        self._pool = []  # idle connections for the parts
+        self._lock = threading.Lock()
+
+    def wanted(self, snapshot) -> bool:
+        """
+        Whether the snapshot is fetched by ranges - it is large or an attempt was interrupted.
+        """
+        if snapshot.partial:
+            return True
+        return bool(self.threshold and snapshot.length and snapshot.length >= self.threshold)
+
+    def keep(self, snapshot, error: Exception):
+        """
+        Keep the body an interrupted attempt received for the next attempt of the snapshot.
+
+        Smaller bodies than `MIN_RESUME` are fetched again from the start.
+        """
+        partial = getattr(error, "partial", None) or b""
+        snapshot.partial = partial if len(partial) >= self.MIN_RESUME else b""
+
+    def close(self):
+        """
+        Close the pooled connections.
+        """
+        with self._lock:
+            for connection in self._pool:
+                connection.close()
+            self._pool = []
+
+    def fetch(self, worker, snapshot, send):
+        """
+        Fetch the snapshot by ranges, continuing `snapshot.partial`.
+
+        Args:
+            worker (Worker): The worker instance.
+            snapshot (Snapshot): The snapshot to fetch.
+            send (callable): Sends the request through the given connection with extra headers
+                and returns response and body.
+        Returns:
+            tuple: The response and the whole body. A response assembled from ranges reports 200.
+        """
+        offset = len(snapshot.partial)
+        split = self.threshold and snapshot.length and snapshot.length >= self.threshold
+        end = offset + self.HEAD - 1 if split else ""
+        try:
+            response, data = send(worker.connection, {**self.IDENTITY, "Range": f"bytes={offset}-{end}"})
+        except Exception as e:
+            self._prefix(e, snapshot.partial)
+            raise
+        if response.status != 206:
+            return response, data  # range ignored - the whole body, or no body at all
+        span = self._span(response)
+        if span is None or span[0] != offset:
+            return send(worker.connection, {})
+        body = [snapshot.partial, data]
+        position, total = span[1] + 1, span[2]
+        if position < total:
+            parts = self._parts(worker, send, position, total)
+            if parts is None:
+                return send(worker.connection, {})
+            for part in parts:
+                if isinstance(part, Exception):
+                    self._prefix(part, b"".join(body))
+                    raise part
+                body.append(part)
+        response.status = 200
+        return response, b"".join(body)
+
+    def _parts(self, worker, send, start: int, total: int):
+        """
+        Fetch the bytes from `start` to the end in up to `parts` ranges at the same time.
+
+        Returns:
+            list: The body of each range in order, or the error of a failed one.
+                None if a range was not answered as requested.
+        """
+        size = -(-(total - start) // self.parts)  # ceil
+        ranges = [(first, min(first + size, total) - 1) for first in range(start, total, size)]
+        results = [None] * len(ranges)
+
+        def run(index, first, last):
+            connection = self._acquire(worker)
+            try:
+                response, data = send(connection, {**self.IDENTITY, "Range": f"bytes={first}-{last}"})
+            except Exception as e:
+                connection.close()
+                results[index] = e
+                return
+            self._release(connection)
+            span = self._span(response) if response.status == 206 else None
+            if span is not None and span[0] == first and len(data) == last - first + 1:
+                results[index] = data
+
+        threads = [threading.Thread(target=run, args=(i, *span), daemon=True) for i, span in enumerate(ranges)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # only the contiguous start of the body is of use for a retry
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                return results[: index + 1]
+            if result is None:
+                return None
+        return results
+
+    def _acquire(self, worker):
+        with self._lock:
+            if self._pool:
+                return self._pool.pop()
+        return worker.connect()
+
+    def _release(self, connection):
+        with self._lock:
+            self._pool.append(connection)
+
+    @staticmethod
+    def _span(response):
+        """
+        First byte, last byte and total size from the Content-Range of a 206 response.
+
+        None if unknown or if the server encoded the part anyway.
+        """
+        if response.getheader("Content-Encoding", "identity").lower() != "identity":
+            return None
+        match = _CONTENT_RANGE.match(response.getheader("Content-Range") or "")
+        if match is None:
+            return None
+        return tuple(int(value) for value in match.groups())
+
+    @staticmethod
+    def _prefix(error: Exception, received: bytes):
+        """
+        Put the body received before `error` in front of its `partial` - the retry continues behind it.
+        """
+        partial = getattr(error, "partial", None) or b""
+        if received:
+            error.partial = received + partial
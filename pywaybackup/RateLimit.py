@@ -0,0 +1,52 @@
+import threading
+import time
+
+
+class RateLimit:
+    """
+    Requests per second to archive.org, shared by all jobs and workers of the process.
+
+    Each request takes the next free slot, `1 / rate` seconds after the one
+    before, and waits for it - the requests are spread evenly instead of
+    leaving in bursts. Jobs of a batch (see `Batch`) run one after another
+    in the same process and take the one instance of `shared`, so the budget
+    holds for the whole batch and not per job. Thread-safe.
+
+    Attributes:
+        rate (float): Requests per second.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.waited = 0.0  # seconds the requests were held back
+        self._next = 0.0  # monotonic time of the next free slot
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, rate: float):
+        """
+        The instance of the process, None if `rate` is 0 (no limit). A new rate applies to the existing instance.
+        """
+        if not rate or rate <= 0:
+            return None
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(rate)
+            cls._shared.rate = rate
+            return cls._shared
+
+    def acquire(self):
+        """
+        Wait for the next free slot.
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + 1 / self.rate
+            wait = slot - now
+            self.waited += wait
+        if wait > 0:
+            time.sleep(wait)
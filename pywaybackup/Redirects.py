@@ -0,0 +1,98 @@
+import os
+import threading
+
+from pywaybackup.db import insert, select, waybackup_redirects
+
+
+class Redirects:
+    """
+    Redirect chains resolved by the downloads, kept in the job database.
+
+    In `all` mode many snapshots redirect to the same nearest capture and each
+    of them walked the same chain again - a full round trip per hop. Every url
+    of a chain which ended on a capture (the target) is stored with it, a later
+    request of any of these urls jumps straight to the target. Once the target
+    was written, further snapshots ending on it are served from its file
+    instead of downloading it again.
+
+    Loaded from the job database, so a resumed job continues with the chains of
+    the interrupted one. Captures written by another selection on the url are
+    stored as targets of their own with their file (see
+    `SnapshotCollection._share_files`). Shared by all workers, thread-safe.
+    """
+
+    _SQL_STORE = "INSERT OR REPLACE INTO waybackup_redirects (url, target, file, content_type) VALUES (?, ?, ?, ?)"
+
+    def __init__(self):
+        self._targets = {}  # url -> target
+        self._ends = set()  # targets of all chains
+        self._files = {}  # target -> (file, content type)
+        self._lock = threading.Lock()
+
+    def load(self, db):
+        """
+        Load the chains stored in the job database.
+        """
+        rows = db.session.execute(
+            select(
+                waybackup_redirects.url,
+                waybackup_redirects.target,
+                waybackup_redirects.file,
+                waybackup_redirects.content_type,
+            )
+        ).all()
+        with self._lock:
+            for url, target, file, content_type in rows:
+                if url != target:
+                    self._targets[url] = target
+                    self._ends.add(target)
+                if file:
+                    self._files[target] = (file, content_type)
+
+    def target(self, url: str):
+        """
+        The capture a redirect from `url` ended on, None if `url` is not known to redirect.
+        """
+        with self._lock:
+            return self._targets.get(url)
+
+    def local(self, target: str):
+        """
+        File and Content-Type the target was written to, None if it was not written (or is gone since).
+        """
+        with self._lock:
+            stored = self._files.get(target)
+        if stored is None or not os.path.isfile(stored[0]):
+            return None
+        return stored
+
+    def store(self, db, urls: list, target: str):
+        """
+        Store the urls of a resolved chain with the capture it ended on.
+        """
+        with self._lock:
+            for url in urls:
+                self._targets[url] = target
+            self._ends.add(target)
+        self._write(db, [(url, target, None, None) for url in urls])
+
+    def written(self, db, target: str, file: str, content_type: str):
+        """
+        Store the file a capture was written to, if it is the target of a known chain.
+        """
+        with self._lock:
+            if target not in self._ends or (target in self._files and os.path.isfile(self._files[target][0])):
+                return
+            self._files[target] = (file, content_type)
+        self._write(db, [(target, target, file, content_type)])
+
+    def _write(self, db, rows: list):
+        raw = db.raw
+        if raw is not None:
+            raw.executemany(self._SQL_STORE, rows)
+            return
+        db.session.execute(
+            insert(waybackup_redirects).prefix_with("OR REPLACE"),
+            [dict(zip(("url", "target", "file", "content_type"), row)) for row in rows],
+        )
+        db.session.commit()
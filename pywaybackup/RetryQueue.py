@@ -0,0 +1,94 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+
+class RetryQueue:
+    """
+    Snapshots waiting for another attempt, ordered by the time they are due.
+
+    A failed snapshot is put back with an exponential backoff (`base` doubled
+    per failed attempt up to `cap`, jittered by +-50% so snapshots failed
+    together do not hit the server together again). The worker moves on to the
+    next snapshot instead of sleeping and picks the retry up once it is due.
+
+    Queued snapshots keep their row locked, an interrupted job resets them to
+    unhandled like any other claimed snapshot. Shared by all workers, thread-safe.
+
+    Attributes:
+        base (float): Delay in seconds after the first failed attempt.
+        cap (float): Upper bound of the delay in seconds.
+    """
+
+    def __init__(self, base: float, cap: float = 600):
+        self.base = base
+        self.cap = cap
+        self._heap = []
+        self._order = itertools.count()  # keeps snapshots due at the same time comparable
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._heap)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Delay in seconds before the next try after `attempt` failed attempts.
+
+        An attempt which did not count (see `Health`) is due at once.
+        """
+        if attempt <= 0:
+            return 0.0
+        delay = min(self.base * 2 ** max(attempt - 1, 0), self.cap)
+        return delay * random.uniform(0.5, 1.5)
+
+    def put(self, snapshot, attempt: int) -> float:
+        """
+        Queue a snapshot for another try after `attempt` failed attempts.
+
+        Returns:
+            float: Seconds until the snapshot is due.
+        """
+        delay = self.backoff(attempt)
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._order), snapshot))
+            self._condition.notify()
+        return delay
+
+    def clear(self) -> int:
+        """
+        Drop all queued snapshots, e.g. at the end of a turn of a batch job (see `Batch`).
+        Their rows stay locked until the job unlocks them.
+
+        Returns:
+            int: The number of snapshots dropped.
+        """
+        with self._condition:
+            dropped = len(self._heap)
+            self._heap = []
+            return dropped
+
+    def pop(self):
+        """
+        Return the snapshot due first if it is due now, otherwise None.
+        """
+        with self._condition:
+            if self._heap and self._heap[0][0] <= time.monotonic():
+                return heapq.heappop(self._heap)[2]
+            return None
+
+    def wait(self):
+        """
+        Wait for the snapshot due first and return it. Returns None once the queue is empty.
+
+        Only for workers without anything else left to do.
+        """
+        with self._condition:
+            while self._heap:
+                due = self._heap[0][0] - time.monotonic()
+                if due <= 0:
+                    return heapq.heappop(self._heap)[2]
+                self._condition.wait(timeout=due)
+            return None
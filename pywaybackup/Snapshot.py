@@ -1,6 +1,8 @@
+import sqlite3
 import threading
 
-from pywaybackup.db import Database, select, update, waybackup_snapshots, and_
+from pywaybackup.db import Database, and_, select, update, waybackup_snapshot_rows, waybackup_snapshots
+from pywaybackup.helper import apply_plan
 from pywaybackup.Url import Url
 from pywaybackup.Verbosity import Verbosity as vb
 
@@ -17,10 +19,43 @@ class Snapshot:
         - file
 
     Thread-safe for SQLite operations using a lock.
+
+    Claim and updates run on the raw sqlite3 connection of the database if there
+    is one (see `Database.raw`), otherwise through the ORM session.
     """
 
     __sqlite_lock = threading.Lock()
 
+    # columns of a fetched row (see waybackup_snapshot_rows)
+    COLUMNS = (
+        "scid",
+        "counter",
+        "timestamp",
+        "url_archive",
+        "url_origin",
+        "url_key",
+        "mimetype",
+        "length",
+        "plan",
+        "attempt",
+        "redirect_url",
+        "redirect_timestamp",
+        "response",
+        "file",
+    )
+
+    # one statement claims and returns the scid (RETURNING needs sqlite 3.35)
+    _SQL_CLAIM = (
+        "UPDATE waybackup_snapshots SET response = 'LOCK' "
+        "WHERE scid = (SELECT scid FROM waybackup_snapshots WHERE response IS NULL ORDER BY priority, scid LIMIT 1) "
+        "AND response IS NULL "
+        "RETURNING scid"
+    )
+    _SQL_NEXT = "SELECT scid FROM waybackup_snapshots WHERE response IS NULL ORDER BY priority, scid LIMIT 1"
+    _SQL_LOCK = "UPDATE waybackup_snapshots SET response = 'LOCK' WHERE scid = ? AND response IS NULL"
+    _SQL_ROW = f"SELECT {', '.join(COLUMNS)} FROM waybackup_snapshot_rows WHERE scid = ?"
+    _SQL_MODIFY = "UPDATE waybackup_snapshots SET {column} = ? WHERE scid = ?"
+
     def __init__(self, db: Database, output: str, mode: str, merge_www: bool = True):
         """
         Initialize a Snapshot instance and fetch its database row if available.
@@ -40,29 +75,43 @@ class Snapshot:
         self._redirect_timestamp = None
         self._response_status = None
         self._file = None
+        self.partial = b""  # body received before an interrupted attempt, resumed by the next one
 
         self._row = self.fetch()
         if self._row:
-            self.scid = self._row.scid
-            self.counter = self._row.counter
-            self.timestamp = self._row.timestamp
-            self.url_archive = self._row.url_archive
-            self.url_origin = self._row.url_origin
-            self.url_key = self._row.url_key
-            self.redirect_url = self._row.redirect_url
-            self.redirect_timestamp = self._row.redirect_timestamp
-            self.response_status = self._row.response
-            self.file = self._row.file
+            self.scid = self._row["scid"]
+            self.counter = self._row["counter"]
+            self.timestamp = self._row["timestamp"]
+            self.url_archive = self._row["url_archive"]
+            self.url_origin = self._row["url_origin"]
+            self.url_key = self._row["url_key"]
+            self.mimetype = self._row["mimetype"]
+            self.length = self._row["length"]
+            self.plan = self._row["plan"]
+            self._attempt = self._row["attempt"] or 0
+            self.redirect_url = self._row["redirect_url"]
+            self.redirect_timestamp = self._row["redirect_timestamp"]
+            self.response_status = self._row["response"]
+            self.file = self._row["file"]
         else:
             self.counter = False
 
+    def attach(self, db: Database):
+        """
+        Continue this snapshot on another database instance (e.g. of the thread it was handed to).
+
+        Args:
+            db (Database): Database connection/session manager of the current thread.
+        """
+        self._db = db
+
     def fetch(self):
         """
         Fetch a snapshot row from the database with response=NULL (not processed).
         Uses row locking to prevent concurrent workers from processing the same row.
 
         Returns:
-            waybackup_snapshots or None: The next unprocessed snapshot row, or None if none available.
+            dict or None: The next unprocessed snapshot row by `COLUMNS`, or None if none available.
         """
         # mark as locked for other workers // only visual because get_snapshot fetches by NULL
         # prevent another worker from fetching between LOCK-update (for sqlite by threading.Lock, else lock row)
@@ -84,7 +133,7 @@ class Snapshot:
             scid = session.execute(
                 select(waybackup_snapshots.scid)
                 .where(waybackup_snapshots.response.is_(None))
-                .order_by(waybackup_snapshots.scid)
+                .order_by(waybackup_snapshots.priority, waybackup_snapshots.scid)
                 .limit(1)
             ).scalar_one_or_none()
 
@@ -114,9 +163,11 @@ class Snapshot:
                 return __get_row()
 
             # The row has been claimed by the worker and can now be fetched.
-            row = session.execute(
-                select(waybackup_snapshots).where(waybackup_snapshots.scid == scid)
-            ).scalar_one_or_none()
+            row = (
+                session.execute(select(waybackup_snapshot_rows).where(waybackup_snapshot_rows.c.scid == scid))
+                .mappings()
+                .one_or_none()
+            )
             try:
                 session.commit()
             except Exception:
@@ -125,8 +176,28 @@ class Snapshot:
                 except Exception:
                     pass
             vb.write(verbose="high", content=f"[Snapshot.fetch] claimed scid={scid} and fetched row")
-            return row
+            return dict(row) if row else None
+
+        def __get_row_raw(raw):
+            # same claim as __get_row, but on prepared statements without the orm in between
+            if sqlite3.sqlite_version_info >= (3, 35, 0):
+                scid = raw.execute(self._SQL_CLAIM).fetchone()
+            else:
+                while True:
+                    scid = raw.execute(self._SQL_NEXT).fetchone()
+                    if scid is None or raw.execute(self._SQL_LOCK, scid).rowcount == 1:
+                        break
+            row = raw.execute(self._SQL_ROW, scid).fetchone() if scid else None
+            if row is None:
+                vb.write(verbose="high", content="[Snapshot.fetch] no unprocessed scid found")
+                return None
+            vb.write(verbose="high", content=f"[Snapshot.fetch] claimed scid={row[0]} and fetched row")
+            return dict(zip(self.COLUMNS, row))
 
+        raw = self._db.raw
+        if raw is not None:
+            with self.__sqlite_lock:
+                return __get_row_raw(raw)
         if __on_sqlite():
             with self.__sqlite_lock:
                 return __get_row()
@@ -142,6 +213,11 @@ class Snapshot:
             value: New value to set for the column.
         """
         column = getattr(waybackup_snapshots, column)
+        raw = self._db.raw
+        if raw is not None:
+            vb.write(verbose="high", content=f"[Snapshot.modify] updating scid={self.scid} column={column.key}")
+            raw.execute(self._SQL_MODIFY.format(column=column.key), (value, self.scid))
+            return
         try:
             vb.write(verbose="high", content=f"[Snapshot.modify] updating scid={self.scid} column={column.key}")
             self._db.session.execute(
@@ -168,17 +244,34 @@ class Snapshot:
 
         Built from the stored url_key, which is the same value the mode filter
         grouped by. Re-parsing the url here would risk the two drifting apart.
+        Every row carries a key since the keys are interned on insert.
+
+        A planned snapshot (see `plan`) gets its final file, an unplanned one the
+        path which is decided at write time.
 
         Returns:
             str: Absolute path to the output file for the snapshot.
         """
         timestamp = None if self.mode in ("last", "first") else self.timestamp
+        return apply_plan(Url.path_from_key(self.url_key, self.output, timestamp), self.plan)
 
-        # rows written before url_key existed, or by a csv without it
-        if not self.url_key:
-            return Url.from_archive(self.url_archive, merge_www=self.merge_www).to_path(self.output, timestamp)
+    @property
+    def attempt(self):
+        """
+        int: Failed attempts of this snapshot so far.
+        """
+        return self._attempt
+
+    @attempt.setter
+    def attempt(self, value):
+        """
+        Set the failed attempts and update the database, so a resumed job continues the count.
 
-        return Url.path_from_key(self.url_key, self.output, timestamp)
+        Args:
+            value (int): The new count.
+        """
+        self._attempt = value
+        self.modify(column="attempt", value=value)
 
     @property
     def redirect_url(self):
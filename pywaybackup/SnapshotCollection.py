@@ -1,7 +1,27 @@
 import json
-
-from pywaybackup.db import Database, and_, delete, func, or_, select, text, tuple_, update, waybackup_snapshots
+import os
+
+from pywaybackup.db import (
+    Database,
+    and_,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    split_origin,
+    text,
+    update,
+    waybackup_hosts,
+    waybackup_keys,
+    waybackup_mimetypes,
+    waybackup_redirects,
+    waybackup_snapshot_rows,
+    waybackup_snapshots,
+)
 from pywaybackup.files import CDXfile, CSVfile
+from pywaybackup.helper import apply_plan, plan_output
+from pywaybackup.NegativeCache import NegativeCache
 from pywaybackup.Url import Url
 from pywaybackup.Verbosity import Progressbar
 from pywaybackup.Verbosity import Verbosity as vb
@@ -14,6 +34,22 @@ class SnapshotCollection:
     Represents the interaction with the snapshot-collection contained in the snapshot database.
     """
 
+    # download orders (see `_schedule`) - each sets the priority of the unhandled snapshots, lowest first
+    ORDERS = {
+        "cdx": "NULL",  # as listed by the cdx
+        "size": "COALESCE(length, 9223372036854775807)",  # smallest first (cdx length), unknown last
+        "html": (  # html pages first, then their assets
+            "CASE WHEN mid IN (SELECT mid FROM waybackup_mimetypes WHERE mimetype = 'text/html') THEN 0 ELSE 1 END"
+        ),
+        "depth": (  # shallowest path first
+            "(SELECT length(url_key) - length(replace(url_key, '/', '')) "
+            "FROM waybackup_keys WHERE waybackup_keys.kid = waybackup_snapshots.kid)"
+        ),
+        "newest": "-timestamp",  # newest capture first
+    }
+    # priority of snapshots claimed after all others
+    DEFERRED = 9223372036854775807
+
     def __init__(self):
         self.db = Database()
         self.cdxfile = None
@@ -22,12 +58,14 @@ class SnapshotCollection:
         self._mode_last = False
 
         self._cdx_total = 0  # absolute amount of snapshots in cdx file
+        self._source = "in CDX file"  # where the snapshots come from
         self._snapshot_total = 0  # absolute amount of snapshots in db
 
         self._snapshot_unhandled = 0  # all unhandled snapshots in the db (without response)
         self._snapshot_handled = 0  # snapshots with a response
 
         self._snapshot_faulty = 0  # error while parsing cdx line
+        self._cdx_newest = None  # newest timestamp inserted from the cdx file
 
         self._merge_www = True  # treat www and non-www as the same url
 
@@ -35,6 +73,11 @@ class SnapshotCollection:
         self._filter_duplicates = 0  # with identical url_archive
         self._filter_mode = 0  # all snapshots filtered by the MODE (last or first)
         self._filter_skip = 0  # content of the csv file
+        self._skip_faulty = 0  # csv rows cut off (e.g. by a hard kill), ignored
+        self._filter_existing = 0  # files already in the output directory
+        self._filter_shared = 0  # written by another selection, copied instead of downloaded
+        self._filter_dead = 0  # failed in an earlier run (negative cache)
+        self._defer_dead = 0  # server errors in an earlier run, downloaded last
         self._filter_response = 0  # snapshots which could not be loaded from cdx file into db or 404
 
     def close(self):
@@ -45,6 +88,17 @@ class SnapshotCollection:
         self._reset_locked_snapshots()
         self._finalize_db()
 
+    def reopen(self):
+        """
+        Continue a collection closed at the end of a turn (see `Batch`) without loading it again.
+
+        The rows are as the last turn left them, only the session is new and the counts are taken again.
+        """
+        self.db = Database()
+        self._snapshot_unhandled = self.count_unhandled()
+        self._snapshot_handled = self.count_handled()
+        self._snapshot_total = self.count_total()
+
     def _write_summary(self):
         """Write summary of download and skip counts."""
         success = self.count_success()
@@ -61,12 +115,35 @@ class SnapshotCollection:
 
     def _finalize_db(self):
         """Commit and close the database connection, and write progress."""
-        self.db.write_progress(self._snapshot_handled, self._snapshot_total)
-        self.db.session.close()
-
-    def load(self, mode: str, cdxfile: CDXfile, csvfile: CSVfile, merge_www: bool = True):
+        # counted, the collection closed at shutdown was never loaded
+        self.db.write_progress(self.count_handled(), self.count_total())
+        self.db.close()
+
+    def load(
+        self,
+        mode: str,
+        cdxfile: CDXfile,
+        csvfile: CSVfile,
+        merge_www: bool = True,
+        output: str = None,
+        order: str = "cdx",
+        dead: NegativeCache = None,
+        sync: bool = False,
+        captures: list = None,
+    ):
         """
         Insert the content of the cdx and csv file into the snapshot table.
+
+        If `output` is given, snapshots whose file already exists there are set as handled
+        and those another selection on the url wrote to its own path are copied from there.
+        The remaining snapshots are downloaded in the given `order` (see `ORDERS`). With
+        `dead`, snapshots which failed in earlier runs are skipped or downloaded last.
+
+        With `sync` the newest inserted timestamp is stored for the next run. A run
+        merging new captures into a complete job (see `Database.get_sync`) keeps
+        the existing files out of the skip, a changed file is to be replaced.
+
+        Given `captures` (timestamp, url_origin) are inserted instead of the cdx file.
         """
         self.cdxfile = cdxfile
         self.csvfile = csvfile
@@ -76,11 +153,16 @@ class SnapshotCollection:
         if mode == "last":
             self._mode_last = True
 
-        line_count = self.cdxfile.count_rows()
-        self._cdx_total = line_count
+        self._cdx_total = self.cdxfile.count_rows() if captures is None else len(captures)
+        self._source = "in CDX file" if captures is None else "in input"
         if not self.db.get_insert_complete():
             vb.write(content="\ninserting snapshots...")
-            self._insert_cdx()
+            if captures is None:
+                self._insert_cdx()
+            else:
+                self._insert_captures(captures)
+            if sync and self._cdx_newest is not None:
+                self.db.set_sync(newest=str(self._cdx_newest))
             self.db.set_insert_complete()
         else:
             vb.write(verbose=True, content="\nAlready inserted CDX data into database")
@@ -93,22 +175,120 @@ class SnapshotCollection:
         if not self.db.get_filter_complete():
             vb.write(content="\nFiltering snapshots (last or first version)...")
             self._filter_snapshots()  # filter: keep newest or oldest based on MODE
+            if output:
+                self._plan_paths(output)  # decide output paths of the remaining snapshots
             self.db.set_filter_complete()
         else:
             vb.write(verbose=True, content="\nAlready filtered snapshots (last or first version)")
 
         self._skip_set()  # set response to NULL or read csv file and write values into db
+        if output:
+            self._share_files(output)  # snapshots another selection wrote elsewhere are copied from there
+        delta = sync and self.db.get_sync()[1] == 0
+        if output and not delta:
+            self._skip_files(output)  # set snapshots as handled which are already in the output directory
+        self._schedule(order)  # download order of the remaining snapshots
+        if dead is not None and dead.enabled:
+            self._skip_dead(dead)  # skip or defer snapshots which failed in earlier runs
 
         self._snapshot_unhandled = self.count_unhandled()  # count all unhandled in db
         self._snapshot_handled = self.count_handled()  # count all handled in db
         self._snapshot_total = self.count_total()  # count all in db
 
-    def _insert_cdx(self):
+    def _intern(self, value_column, id_column, values, known: dict):
+        """
+        Add unknown values to their lookup table and map them to their ids in `known`.
+        """
+        missing = list({value for value in values if value not in known})
+        if not missing:
+            return
+        self.db.session.execute(
+            insert(value_column.class_.__table__).prefix_with("OR IGNORE"),
+            [{value_column.key: value} for value in missing],
+        )
+        known.update(self.db.session.execute(select(value_column, id_column).where(value_column.in_(missing))).all())
+
+    def _insert_rows(self, line_batch: list, interned: tuple) -> int:
         """
-        Insert the content of the cdx file into the snapshot table.
+        Insert a batch of parsed snapshots (timestamp, host, origin_path, origin, mimetype, length, response).
+
         - Removes duplicates by url_archive (same timestamp and url_origin)
-        - Filters the snapshots by the given mode (last or first)
+        - Interns hosts, keys and mimetypes into their lookup tables, `interned` holds the known ids
+
+        Returns:
+            int: Number of inserted snapshots.
         """
+        hosts, keys, mimetypes = interned
+        # identity of the file on disk - the mode filter groups by this
+        for row, url_key in zip(line_batch, Url.keys([row["origin"] for row in line_batch], self._merge_www)):
+            row["url_key"] = url_key
+        self._intern(waybackup_hosts.host, waybackup_hosts.hid, (row["host"] for row in line_batch), hosts)
+        self._intern(waybackup_keys.url_key, waybackup_keys.kid, (row["url_key"] for row in line_batch), keys)
+        self._intern(
+            waybackup_mimetypes.mimetype,
+            waybackup_mimetypes.mid,
+            (row["mimetype"] for row in line_batch),
+            mimetypes,
+        )
+        rows = [
+            {
+                "timestamp": row["timestamp"],
+                "hid": hosts[row["host"]],
+                "origin_path": row["origin_path"],
+                "kid": keys[row["url_key"]],
+                "mid": mimetypes[row["mimetype"]],
+                "length": row["length"],
+                "response": row["response"],
+            }
+            for row in line_batch
+        ]
+        # duplicates within the batch and against the database are dropped by the unique constraint
+        result = self.db.session.execute(insert(waybackup_snapshots.__table__).prefix_with("OR IGNORE"), rows)
+        self.db.session.commit()
+        newest = max(row["timestamp"] for row in rows)
+        if self._cdx_newest is None or newest > self._cdx_newest:
+            self._cdx_newest = newest
+        inserted = max(result.rowcount, 0)
+        self._filter_duplicates += len(line_batch) - inserted
+        return inserted
+
+    def _insert_captures(self, captures: list):
+        """
+        Insert a list of captures (timestamp, url_origin) given instead of a cdx file (see `InputFile`).
+
+        Neither mimetype nor length are known, the snapshots are written as the cdx
+        lists captures without them (`unk`) and decided at write time.
+        """
+        vb.write(verbose=True, content=f"[SnapshotCollection._insert_captures] inserting {len(captures)} captures")
+        interned = ({}, {}, {})
+        batchsize = 2500
+        for i in range(0, len(captures), batchsize):
+            line_batch = []
+            for timestamp, origin in captures[i : i + batchsize]:
+                if origin.lower().startswith("mailto"):
+                    self._filter_mailto += 1
+                    continue
+                host, origin_path = split_origin(origin)
+                line_batch.append(
+                    {
+                        "timestamp": timestamp,
+                        "host": host,
+                        "origin_path": origin_path,
+                        "origin": origin,
+                        "mimetype": "unk",
+                        "length": None,
+                        "response": None,
+                    }
+                )
+            if line_batch:
+                self._insert_rows(line_batch, interned)
+
+    def _insert_cdx(self):
+        """
+        Insert the content of the cdx file into the snapshot table (see `_insert_rows`).
+        """
+
+        interned = ({}, {}, {})  # host -> hid, url_key -> kid, mimetype -> mid
 
         def __parse_line(line):
             line = json.loads(line)
@@ -118,59 +298,23 @@ class SnapshotCollection:
                 "mimetype": line[2],
                 "statuscode": line[3],
                 "origin": line[4],
+                "length": line[5] if len(line) > 5 else None,  # cdx files queried before length was
             }
             # cdx results contain mailto: links, which are no downloadable resources
             if line["origin"].lower().startswith("mailto"):
                 return None
-            url_archive = f"https://web.archive.org/web/{line['timestamp']}id_/{line['origin']}"
+            host, origin_path = split_origin(line["origin"])
             statuscode = line["statuscode"] if line["statuscode"] in ("301", "404") else None
             return {
-                "timestamp": line["timestamp"],
-                "url_archive": url_archive,
-                "url_origin": line["origin"],
-                # identity of the file on disk - the mode filter groups by this
-                "url_key": Url(line["origin"], merge_www=self._merge_www).key,
+                "timestamp": int(line["timestamp"]),
+                "host": host,
+                "origin_path": origin_path,
+                "origin": line["origin"],
+                "mimetype": line["mimetype"],
+                "length": int(line["length"]) if line["length"] and line["length"].isdigit() else None,
                 "response": statuscode,
             }
 
-        def _insert_batch_safe(line_batch):
-            # removes duplicates within the line_batch itself
-            seen_keys = set()
-            unique_batch = []
-            for row in line_batch:
-                key = (row["timestamp"], row["url_origin"], row["url_archive"])
-                if key not in seen_keys:
-                    seen_keys.add(key)
-                    unique_batch.append(row)
-
-            # removes duplicates from the line_batch if they are already in the database
-            # get existing entries by tuple, remove existing rows from the unique_batch
-            keys = [(row["timestamp"], row["url_origin"], row["url_archive"]) for row in unique_batch]
-            existing = (
-                self.db.session.query(
-                    waybackup_snapshots.timestamp,
-                    waybackup_snapshots.url_origin,
-                    waybackup_snapshots.url_archive,
-                )
-                .filter(
-                    tuple_(
-                        waybackup_snapshots.timestamp, waybackup_snapshots.url_origin, waybackup_snapshots.url_archive
-                    ).in_(keys)
-                )
-                .all()
-            )
-            existing_rows = set(existing)
-            new_rows = [
-                row
-                for row in unique_batch
-                if (row["timestamp"], row["url_origin"], row["url_archive"]) not in existing_rows
-            ]
-            if new_rows:
-                self.db.session.bulk_insert_mappings(waybackup_snapshots, new_rows)
-                self.db.session.commit()
-            self._filter_duplicates += len(line_batch) - len(new_rows)
-            return len(new_rows)
-
         vb.write(verbose=None, content="\nInserting CDX data into database...")
 
         try:
@@ -200,7 +344,7 @@ class SnapshotCollection:
 
                     try:
                         parsed = __parse_line(line)
-                    except json.decoder.JSONDecodeError:
+                    except (json.decoder.JSONDecodeError, ValueError):
                         self._snapshot_faulty += 1
                         continue
                     if parsed is None:
@@ -209,12 +353,12 @@ class SnapshotCollection:
                     line_batch.append(parsed)
 
                     if len(line_batch) >= line_batchsize:
-                        total_inserted += _insert_batch_safe(line_batch=line_batch)
+                        total_inserted += self._insert_rows(line_batch, interned)
                         line_batch = []
                         progressbar.update(line_batchsize)
 
                 if line_batch:
-                    total_inserted += _insert_batch_safe(line_batch=line_batch)
+                    total_inserted += self._insert_rows(line_batch, interned)
                     progressbar.update(len(line_batch))
 
             self.db.session.commit()
@@ -240,25 +384,26 @@ class SnapshotCollection:
         if self._mode_last:
             self.db.session.execute(
                 text(
-                    "CREATE INDEX IF NOT EXISTS idx_waybackup_snapshots_url_key_timestamp_desc "
-                    "ON waybackup_snapshots (url_key, timestamp DESC)"
+                    "CREATE INDEX IF NOT EXISTS idx_waybackup_snapshots_kid_timestamp_desc "
+                    "ON waybackup_snapshots (kid, timestamp DESC)"
                 )
             )
         # index for filtering first snapshots
         if self._mode_first:
             self.db.session.execute(
                 text(
-                    "CREATE INDEX IF NOT EXISTS idx_waybackup_snapshots_url_key_timestamp_asc "
-                    "ON waybackup_snapshots (url_key, timestamp ASC)"
+                    "CREATE INDEX IF NOT EXISTS idx_waybackup_snapshots_kid_timestamp_asc "
+                    "ON waybackup_snapshots (kid, timestamp ASC)"
                 )
             )
-        # index for skippable snapshots
+        # index for claiming the next unhandled snapshot by its order, shrinks as the job progresses
         self.db.session.execute(
             text(
-                "CREATE INDEX IF NOT EXISTS idx_waybackup_snapshots_timestamp_url_origin_response "
-                "ON waybackup_snapshots (timestamp, url_origin)"
+                "CREATE INDEX IF NOT EXISTS idx_waybackup_snapshots_unhandled "
+                "ON waybackup_snapshots (priority, scid) WHERE response IS NULL"
             )
         )
+        # skippable snapshots are looked up by the unique (timestamp, hid, origin_path) index
         self.db.session.commit()
 
     def _filter_snapshots(self):
@@ -284,7 +429,7 @@ class SnapshotCollection:
                 rownum = (
                     func.row_number()
                     .over(
-                        partition_by=waybackup_snapshots.url_key,
+                        partition_by=waybackup_snapshots.kid,
                         order_by=ordering,
                     )
                     .label("rn")
@@ -298,8 +443,8 @@ class SnapshotCollection:
                 self._filter_mode = result.rowcount
 
         def _enumerate_counter():
-            # this sets the counter (snapshot number x / y) to 1 ... n
-            offset = 1
+            # this sets the counter (snapshot number x / y) to 1 ... n, new rows of a sync continue after the last
+            offset = (self.db.session.execute(select(func.max(waybackup_snapshots.counter))).scalar() or 0) + 1
             batch_size = 5000
             while True:
                 rows = (
@@ -326,27 +471,136 @@ class SnapshotCollection:
         )
         self.db.session.commit()
 
+    def _plan_paths(self, output: str):
+        """
+        Decide the output path of every snapshot before the download.
+
+        A url may need the path of another url as its folder (`/docs` and
+        `/docs/guide`). Found at write time, the file in the way is moved aside
+        and sniffed again - racy between workers and extra I/O. With all keys
+        known after the filter, the paths which are also a folder are collected
+        in one pass and the plan of each snapshot is stored (see `helper.plan_output`).
+        Snapshots without a telling cdx mimetype stay unplanned and are decided
+        at write time.
+        """
+        vb.write(verbose=True, content="[SnapshotCollection._plan_paths] planning output paths")
+        rows = waybackup_snapshot_rows.c
+        stmt = select(rows.scid, rows.timestamp, rows.url_key, rows.mimetype)
+        with_timestamp = not (self._mode_first or self._mode_last)
+        output = os.path.abspath(output)
+
+        def __paths():
+            for scid, timestamp, url_key, mimetype in self.db.session.execute(stmt):
+                yield scid, Url.path_from_key(url_key, output, timestamp if with_timestamp else None), mimetype
+
+        # every folder below output which some path needs
+        folders = set()
+        for _, path, _ in __paths():
+            parent = os.path.dirname(path)
+            while len(parent) > len(output) and parent not in folders:
+                folders.add(parent)
+                parent = os.path.dirname(parent)
+
+        plans = {}  # plan -> scids
+        for scid, path, mimetype in __paths():
+            plan = plan_output(path, path in folders, mimetype)
+            if plan is not None:
+                plans.setdefault(plan, []).append(scid)
+
+        batchsize = 2500
+        for plan, scids in plans.items():
+            for i in range(0, len(scids), batchsize):
+                self.db.session.execute(
+                    update(waybackup_snapshots)
+                    .where(waybackup_snapshots.scid.in_(scids[i : i + batchsize]))
+                    .values(plan=plan)
+                )
+        self.db.session.commit()
+        vb.write(
+            verbose=True,
+            content=f"[SnapshotCollection._plan_paths] planned {sum(len(scids) for scids in plans.values())} snapshots",
+        )
+
+    def _schedule(self, order: str):
+        """
+        Set the priority of the unhandled snapshots for the download `order`.
+
+        Claiming takes the lowest priority first through the partial index on
+        (priority, scid), so any order costs the same per snapshot as the cdx
+        order. Set on every load, a resumed job may continue in another order.
+        """
+        vb.write(verbose=True, content=f"[SnapshotCollection._schedule] download order: {order}")
+        self.db.session.execute(
+            text(f"UPDATE waybackup_snapshots SET priority = {self.ORDERS[order]} WHERE response IS NULL")
+        )
+        self.db.session.commit()
+
+    def _skip_dead(self, dead: NegativeCache):
+        """
+        Look up the unhandled snapshots in the negative cache (see `NegativeCache`).
+
+        Captures which were missing or empty are set as handled with the status
+        of their failure, as if this run had failed on them. Those with server
+        errors keep their place in the job but are claimed after all others.
+        """
+        rows = waybackup_snapshot_rows.c
+        result = self.db.session.execute(
+            select(rows.scid, rows.timestamp, rows.url_archive, rows.url_origin).where(rows.response.is_(None))
+        ).all()
+        known = dead.lookup([row.url_archive for row in result])
+        if not known:
+            return
+        skipped, deferred = [], []
+        for scid, timestamp, url_archive, url_origin in result:
+            if url_archive not in known:
+                continue
+            status, defer = known[url_archive]
+            if defer:
+                deferred.append({"scid": scid, "priority": self.DEFERRED})
+            else:
+                skipped.append({"scid": scid, "response": status})
+                self.csvfile.append([timestamp, url_archive, url_origin, None, None, status, None])
+        if skipped or deferred:
+            self.db.session.execute(update(waybackup_snapshots), skipped + deferred)
+            self.db.session.commit()
+        self._filter_dead = len(skipped)
+        self._defer_dead = len(deferred)
+        vb.write(
+            verbose=True,
+            content=f"[SnapshotCollection._skip_dead] {len(skipped)} skipped, {len(deferred)} deferred",
+        )
+
     def _skip_set(self):
         """
         If an existing csv-file for the job was found, the responses will be overwritten by the csv-content.
+
+        A row cut off while it was written (a hard kill) is ignored and counted, its snapshot is downloaded again.
         """
 
         # ? for now per row / no bulk for compatibility
         try:
             vb.write(verbose=True, content="[SnapshotCollection._skip_set] applying CSV skips to DB")
+            hosts = dict(self.db.session.execute(select(waybackup_hosts.host, waybackup_hosts.hid)).all())
             with self.csvfile as f:
                 total_skipped = 0
                 for row in f:
+                    timestamp = row.get("timestamp") or ""
+                    if not row.get("url_origin") or not timestamp.isdigit() or row.get("response") is None:
+                        self._skip_faulty += 1
+                        continue
+                    if row["response"] == "LOCK":
+                        continue  # journaled by an older version while still claimed, downloaded again
+                    host, origin_path = split_origin(row["url_origin"])
                     self.db.session.execute(
                         update(waybackup_snapshots)
                         .where(
                             and_(
-                                waybackup_snapshots.timestamp == row["timestamp"],
-                                waybackup_snapshots.url_origin == row["url_origin"],
+                                waybackup_snapshots.timestamp == int(timestamp),
+                                waybackup_snapshots.hid == hosts.get(host),
+                                waybackup_snapshots.origin_path == origin_path,
                             )
                         )
                         .values(
-                            url_archive=row["url_archive"],
                             redirect_url=row["redirect_url"],
                             redirect_timestamp=row["redirect_timestamp"],
                             response=row["response"],
@@ -369,16 +623,137 @@ class SnapshotCollection:
                 vb.write(verbose=True, content="[SnapshotCollection._skip_set] rollback failed")
             raise
 
+    def _share_files(self, output: str):
+        """
+        Copy the snapshots which another selection on this url downloaded instead of requesting them again.
+
+        All jobs on a url share its csv, so a job in another mode or with other
+        filters finds the snapshots downloaded before as handled - with the file
+        of that selection, e.g. in the timestamp folder of `all`. Such a
+        snapshot is set unhandled again and its file registered as a local copy
+        of the capture (see `Redirects`), the download then writes it to the
+        path of this selection without a request.
+        """
+        rows = waybackup_snapshot_rows.c
+        result = self.db.session.execute(
+            select(rows.scid, rows.timestamp, rows.url_archive, rows.url_key, rows.plan, rows.file).where(
+                and_(rows.file.is_not(None), rows.file != "")
+            )
+        )
+        with_timestamp = not (self._mode_first or self._mode_last)
+        shared, copies = [], []
+        for scid, timestamp, url_archive, url_key, plan, file in result:
+            path = apply_plan(Url.path_from_key(url_key, output, timestamp if with_timestamp else None), plan)
+            own = (path, path + ".html", os.path.join(path, "index.html"), os.path.join(path, os.path.basename(path)))
+            if os.path.abspath(file) in map(os.path.abspath, own) or not os.path.isfile(file):
+                continue
+            shared.append(
+                {"scid": scid, "response": None, "file": None, "redirect_url": None, "redirect_timestamp": None}
+            )
+            copies.append({"url": url_archive, "target": url_archive, "file": file})
+        if shared:
+            self.db.session.execute(update(waybackup_snapshots), shared)
+            # a url which redirected keeps its chain, its target is shared by its own row
+            self.db.session.execute(insert(waybackup_redirects).prefix_with("OR IGNORE"), copies)
+            self.db.session.commit()
+        self._filter_shared = len(shared)
+        vb.write(
+            verbose=True,
+            content=f"[SnapshotCollection._share_files] {len(shared)} snapshots written by another selection",
+        )
+
+    def _skip_files(self, output: str):
+        """
+        Set unhandled snapshots as handled if their file already exists in the output directory.
+
+        A resumed job would otherwise download every body just to find the file
+        EXISTING. The domain folders are scanned once and the planned path of
+        each unhandled snapshot is matched against the scan - including the
+        `.html` or `index.html` variant a previous download may have written.
+        """
+        vb.write(verbose=True, content="[SnapshotCollection._skip_files] scanning output directory")
+        output = os.path.abspath(output)  # the planned paths are absolute
+        files, dirs = set(), set()
+        domains = {key.partition("/")[0] for key in self.db.session.execute(select(waybackup_keys.url_key)).scalars()}
+        stack = [os.path.join(output, domain) for domain in domains if domain]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.add(entry.path)
+                            stack.append(entry.path)
+                        else:
+                            files.add(entry.path)
+            except OSError:
+                continue
+        if not files:
+            return
+
+        def __existing(path):
+            if path in files:
+                return path
+            if not os.path.splitext(path)[1] and path + ".html" in files:
+                return path + ".html"
+            if path in dirs:
+                for index in ("index.html", os.path.basename(path)):
+                    if os.path.join(path, index) in files:
+                        return os.path.join(path, index)
+            return None
+
+        rows = waybackup_snapshot_rows.c
+        result = self.db.session.execute(
+            select(rows.scid, rows.timestamp, rows.url_archive, rows.url_origin, rows.url_key, rows.plan).where(
+                rows.response.is_(None)
+            )
+        )
+        with_timestamp = not (self._mode_first or self._mode_last)
+        existing = []
+        for scid, timestamp, url_archive, url_origin, url_key, plan in result:
+            path = Url.path_from_key(url_key, output, timestamp if with_timestamp else None)
+            file = __existing(apply_plan(path, plan))
+            if file:
+                existing.append({"scid": scid, "response": "200", "file": file})
+                self.csvfile.append([timestamp, url_archive, url_origin, None, None, "200", file])
+        if existing:
+            self.db.session.execute(update(waybackup_snapshots), existing)
+            self.db.session.commit()
+        self._filter_existing = len(existing)
+        vb.write(
+            verbose=True,
+            content=f"[SnapshotCollection._skip_files] {len(existing)} snapshots found in output directory",
+        )
+
+    # counts run often (status ticks, summary) - kept as constant sql for the raw connection
+    _SQL_COUNT = {
+        "total": "SELECT COUNT(*) FROM waybackup_snapshots",
+        "handled": "SELECT COUNT(*) FROM waybackup_snapshots WHERE response IS NOT NULL",
+        "unhandled": "SELECT COUNT(*) FROM waybackup_snapshots WHERE response IS NULL",
+        "success": "SELECT COUNT(*) FROM waybackup_snapshots WHERE file IS NOT NULL AND file != ''",
+        "fail": "SELECT COUNT(*) FROM waybackup_snapshots WHERE file IS NULL OR file = ''",
+    }
+
+    def _count_raw(self, count: str) -> int:
+        return self.db.raw.execute(self._SQL_COUNT[count]).fetchone()[0]
+
     def count_total(self) -> int:
+        if self.db.raw is not None:
+            return self._count_raw("total")
         return self.db.session.query(waybackup_snapshots.scid).count()
 
     def count_handled(self) -> int:
+        if self.db.raw is not None:
+            return self._count_raw("handled")
         return self.db.session.query(waybackup_snapshots.scid).where(waybackup_snapshots.response.is_not(None)).count()
 
     def count_unhandled(self) -> int:
+        if self.db.raw is not None:
+            return self._count_raw("unhandled")
         return self.db.session.query(waybackup_snapshots.scid).where(waybackup_snapshots.response.is_(None)).count()
 
     def count_success(self) -> int:
+        if self.db.raw is not None:
+            return self._count_raw("success")
         return (
             self.db.session.query(waybackup_snapshots.scid)
             .where(and_(waybackup_snapshots.file.is_not(None), waybackup_snapshots.file != ""))
@@ -386,6 +761,8 @@ class SnapshotCollection:
         )
 
     def count_fail(self) -> int:
+        if self.db.raw is not None:
+            return self._count_raw("fail")
         return (
             self.db.session.query(waybackup_snapshots.scid)
             .where(or_(waybackup_snapshots.file.is_(None), waybackup_snapshots.file == ""))
@@ -394,7 +771,7 @@ class SnapshotCollection:
 
     def print_calculation(self):
         vb.write(content="\nSnapshot calculation:")
-        vb.write(content=f"-----> {'in CDX file'.ljust(18)}: {self._cdx_total:,}")
+        vb.write(content=f"-----> {self._source.ljust(18)}: {self._cdx_total:,}")
 
         if self._filter_mailto > 0:
             vb.write(content=f"-----> {'removed mailto'.ljust(18)}: {self._filter_mailto:,}")
@@ -405,6 +782,14 @@ class SnapshotCollection:
 
         if self._filter_skip > 0:
             vb.write(content=f"-----> {'skip existing'.ljust(18)}: {self._filter_skip:,}")
+        if self._filter_existing > 0:
+            vb.write(content=f"-----> {'skip downloaded'.ljust(18)}: {self._filter_existing:,}")
+        if self._filter_shared > 0:
+            vb.write(content=f"-----> {'copy downloaded'.ljust(18)}: {self._filter_shared:,}")
+        if self._filter_dead > 0:
+            vb.write(content=f"-----> {'skip failed before'.ljust(18)}: {self._filter_dead:,}")
+        if self._defer_dead > 0:
+            vb.write(content=f"-----> {'deferred (errors)'.ljust(18)}: {self._defer_dead:,}")
         if self._filter_response > 0:
             vb.write(content=f"-----> {'skip statuscode'.ljust(18)}: {self._filter_response}")
 
@@ -415,3 +800,5 @@ class SnapshotCollection:
 
         if self._snapshot_faulty > 0:
             vb.write(content=f"\n-----> {'!!! parsing error'.ljust(18)}: {self._snapshot_faulty:,}")
+        if self._skip_faulty > 0:
+            vb.write(content=f"\n-----> {'!!! csv rows cut'.ljust(18)}: {self._skip_faulty:,}")
@@ -0,0 +1,174 @@
+import http.client
+import socket
+import threading
+import time
+
+from pywaybackup.Decoder import Decoder
+from pywaybackup.Verbosity import Verbosity as vb
+
+
+class TransferTimeout(socket.timeout):
+    """
+    A download aborted by one of the `Timeouts`, caught like any socket timeout.
+
+    Attributes:
+        cause (str): Which limit was hit, one of `Timeouts.CAUSES`.
+        partial (bytes): Body received before the abort (as `http.client.IncompleteRead`).
+    """
+
+    def __init__(self, cause: str, limit: float, partial: bytes = b""):
+        self.cause = cause
+        self.partial = partial
+        unit = "bytes/s" if cause == "slow" else "seconds"
+        super().__init__(f"timeout ({cause}, {limit:g} {unit})")
+
+
+class Timeouts:
+    """
+    Limits for a single request, so a stalled server can not hang a worker.
+
+    - connect: opening the connection (incl. the tls handshake)
+    - first-byte: from sending the request to the response headers
+    - idle: between two reads of the body
+    - deadline: the whole request, from connecting to the last byte
+    - slow: the body arrives below `min_rate` bytes/s (judged after `RATE_GRACE` seconds)
+
+    Every limit of 0 is disabled. Each abort raises a `TransferTimeout` and is
+    counted by its cause, so the limits can be tuned from the summary of a job.
+    Shared by all workers, thread-safe.
+
+    Attributes:
+        connect (float): Seconds to open the connection.
+        first_byte (float): Seconds to wait for the response headers.
+        idle (float): Seconds to wait for the next part of the body.
+        deadline (float): Seconds for the whole request.
+        min_rate (float): Lowest acceptable transfer rate in bytes/s.
+        counts (dict): Aborted requests by cause.
+    """
+
+    CAUSES = ("connect", "first-byte", "idle", "deadline", "slow")
+    # body read per call, each read waits at most `idle` seconds
+    CHUNK = 64 * 1024
+    # seconds of body before the transfer rate is judged - tcp needs a moment to ramp up
+    RATE_GRACE = 10
+
+    def __init__(
+        self, connect: float = 30, first_byte: float = 30, idle: float = 30, deadline: float = 0, min_rate: float = 0
+    ):
+        self.connect = connect
+        self.first_byte = first_byte
+        self.idle = idle
+        self.deadline = deadline
+        self.min_rate = min_rate
+        self.counts = dict.fromkeys(self.CAUSES, 0)
+        self._lock = threading.Lock()
+
+    def summary(self) -> str:
+        """
+        str: The aborted requests by cause, empty if there were none.
+        """
+        with self._lock:
+            return ", ".join(f"{cause} {count}" for cause, count in self.counts.items() if count)
+
+    def _expired(self, cause: str, limit: float, partial: bytes = b"") -> TransferTimeout:
+        with self._lock:
+            self.counts[cause] += 1
+        return TransferTimeout(cause, limit, partial)
+
+    def _limit(self, sock, cause: str, limit: float, start: float) -> tuple:
+        """
+        Set the socket timeout to `limit`, shortened to what is left of the deadline.
+
+        Returns:
+            tuple: Cause and limit of a timeout raised on the socket from now on.
+        """
+        timeout = limit or None
+        if self.deadline:
+            remaining = self.deadline - (time.monotonic() - start)
+            if remaining <= 0:
+                raise self._expired("deadline", self.deadline)
+            if timeout is None or remaining < timeout:
+                cause, limit, timeout = "deadline", self.deadline, remaining
+        if sock is not None:
+            sock.settimeout(timeout)
+        return cause, limit
+
+    def send(self, connection, method: str, url: str, headers: dict):
+        """
+        Send a request through the connection and read the whole response within the limits.
+
+        The body is decoded as it arrives (see `Decoder`), except for partial
+        responses (206) - their parts only decode as a whole. A body which fails
+        to decode is returned as received.
+
+        Args:
+            connection (http.client.HTTPConnection): The connection, opened if it is not.
+            method (str): The request method.
+            url (str): The url to request.
+            headers (dict): The request headers.
+        Returns:
+            tuple: The response and its (decoded) body.
+        Raises:
+            TransferTimeout: If a limit was hit.
+            http.client.IncompleteRead: If the server closed before the end of the body.
+                Its `partial` body is only kept if it was not encoded - an encoded
+                one can not be continued from the decoded length.
+        """
+        start = time.monotonic()
+        if connection.sock is None:
+            connection.timeout = self.connect or None
+            try:
+                connection.connect()
+            except socket.timeout:
+                raise self._expired("connect", self.connect) from None
+        sock = connection.sock  # kept - the connection drops it if the server closes after the response
+
+        cause, limit = self._limit(sock, "first-byte", self.first_byte, start)
+        try:
+            connection.request(method, url, headers=headers)
+            response = connection.getresponse()
+        except socket.timeout:
+            raise self._expired(cause, limit) from None
+
+        decoder = Decoder(response.getheader("Content-Encoding") if response.status != 206 else None)
+        encoded = decoder.active
+        chunks = []  # as received
+        decoded = []
+        received = 0
+        body_start = time.monotonic()
+
+        def partial():
+            return b"" if encoded else b"".join(chunks)
+
+        while True:
+            cause, limit = self._limit(sock, "idle", self.idle, start)
+            try:
+                chunk = response.read1(self.CHUNK)
+            except socket.timeout:
+                raise self._expired(cause, limit, partial()) from None
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+            if decoder.active:
+                try:
+                    decoded.append(decoder.decode(chunk))
+                except Exception:
+                    decoder.active = False
+            if self.min_rate:
+                elapsed = time.monotonic() - body_start
+                if elapsed > self.RATE_GRACE and received / elapsed < self.min_rate:
+                    raise self._expired("slow", self.min_rate, partial())
+        if response.length:  # read1 ends quietly where read raises
+            raise http.client.IncompleteRead(partial(), response.length)
+        response.read()  # read1 leaves a complete response open, the connection could not be reused
+
+        if decoder.active:
+            try:
+                decoded.append(decoder.flush())
+                return response, b"".join(decoded)
+            except Exception:
+                pass
+        if encoded:
+            vb.write(verbose=None, content=f"DECOMPRESS SKIPPED ({decoder.encoding}) - {url}")
+        return response, b"".join(chunks)
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 
 
 class Url:
@@ -11,13 +12,19 @@ class Url:
     folder), which is what makes two urls "the same file".
 
     Immutable by convention - build one, read from it, drop it. `__slots__`
-    keeps it cheap enough to run per cdx row on six-figure jobs.
+    keeps it cheap enough to run per cdx row on six-figure jobs. `keys`
+    memoizes the key (a plain string) by url, since a cdx repeats the same
+    origin for every timestamp.
     """
 
     __slots__ = ("domain_raw", "subdir", "filename_raw", "_merge_www")
 
     # problematic in file- and foldernames
     SPECIAL_CHARS = [":", "*", "?", "&", "=", "<", ">", "\\", "|", "#", "!", "~"]
+    _ESCAPE = str.maketrans({char: f"%{ord(char):02x}" for char in SPECIAL_CHARS})
+
+    # urls memoized by `keys`
+    CACHE_SIZE = 65536
 
     # path segments that would climb out of the output directory
     TRAVERSAL = (".", "..")
@@ -35,6 +42,8 @@ class Url:
         Encoded rather than dropped, so the snapshot keeps a distinct filename
         instead of silently colliding with another url.
         """
+        if not path.startswith(".") and "/." not in path:
+            return path  # no segment starts with a dot
         return "/".join(
             segment.replace(".", "%2e") if segment in cls.TRAVERSAL else segment for segment in path.split("/")
         )
@@ -63,12 +72,22 @@ class Url:
             filename = ""
         subdir = "/".join(path_parts).strip("/")
 
-        for char in self.SPECIAL_CHARS:
-            subdir = subdir.replace(char, f"%{ord(char):02x}")
-            filename = filename.replace(char, f"%{ord(char):02x}")
+        subdir = subdir.translate(self._ESCAPE)
+        filename = filename.translate(self._ESCAPE)
         self.subdir = self._contain(subdir)
         self.filename_raw = self._contain(filename.replace("%20", " "))
 
+    @classmethod
+    def keys(cls, urls: list, merge_www: bool = True) -> list:
+        """
+        Map a batch of urls to their `key`, in order.
+
+        Args:
+            urls (list): The urls to map.
+            merge_www (bool): Strip a leading `www.` from the domain (see `domain`).
+        """
+        return [_key(url, merge_www) for url in urls]
+
     @classmethod
     def from_archive(cls, url_archive: str, merge_www: bool = True) -> "Url":
         """
@@ -135,3 +154,8 @@ class Url:
             domain, _, rest = key.partition("/")
             return os.path.abspath(os.path.join(output, domain, timestamp, rest))
         return os.path.abspath(os.path.join(output, key))
+
+
+@lru_cache(maxsize=Url.CACHE_SIZE)
+def _key(url: str, merge_www: bool) -> str:
+    return Url(url, merge_www).key
@@ -91,10 +91,12 @@ class Verbosity:
     log = None
 
     @classmethod
-    def init(cls, logfile=None, silent: bool = False, verbose: Union[bool, str, int] = False, progress=None):
+    def init(
+        cls, logfile=None, silent: bool = False, verbose: Union[bool, str, int] = False, progress=None, append=False
+    ):
         cls.silent = silent
         cls.level = VerbosityLevel.from_value(verbose)
-        cls.logfile = open(logfile, "w", encoding="utf-8") if logfile else None
+        cls.logfile = open(logfile, "a" if append else "w", encoding="utf-8") if logfile else None
         cls.PROGRESS = progress
 
     @classmethod
@@ -102,6 +104,7 @@ class Verbosity:
         if cls.PROGRESS:
             if cls.pbar is not None:
                 cls.pbar.close()
+                cls.pbar = None  # the next job in the process starts its own
         if cls.logfile:
             cls.logfile.close()
 
@@ -1,3 +1,4 @@
+import copy
 import http.client
 
 from pywaybackup.db import Database
@@ -11,52 +12,87 @@ class Worker:
     Worker buffers its messages in a Message object. Output has to be done with write() method.
     """
 
-    def __init__(self, id: int, output: str, mode: str, merge_www: bool = True):
+    def __init__(self, id: int, output: str, mode: str, merge_www: bool = True, timeout: float = None):
         self.id = id
         self.output = output
         self.mode = mode
         self.merge_www = merge_www
+        self.timeout = timeout  # for connecting, requests set their own (see Timeouts)
         self.message = Message(self)
+        self.db = None
+        self.connection = None
 
     def init(self):
         self.db = Database()
-        self.connection = http.client.HTTPSConnection("web.archive.org")
+        if self.connection is None:  # kept by a `WorkerPool` from the last job
+            self.connection = self.connect()
 
-    def close(self):
+    def connect(self) -> http.client.HTTPSConnection:
+        """
+        Open a new connection to the Wayback Machine.
+        """
+        return http.client.HTTPSConnection("web.archive.org", timeout=self.timeout)
+
+    def close(self, keep_connection: bool = False):
         """
-        Try to close the database and connection.
+        Try to close the database and connection (unless `keep_connection`, for the next job of a `WorkerPool`).
         """
         try:
             if hasattr(self, "db") and self.db:
                 try:
                     vb.write(verbose="high", content=f"[Worker.close] closing DB for worker {self.id}")
                     self.db.close()
+                    self.db = None
                     vb.write(verbose="high", content=f"[Worker.close] DB closed for worker {self.id}")
                 except Exception:
                     pass
         finally:
             try:
-                if hasattr(self, "connection") and self.connection:
+                if self.connection and not keep_connection:
                     vb.write(verbose="high", content=f"[Worker.close] closing connection for worker {self.id}")
                     self.connection.close()
+                    self.connection = None
                     vb.write(verbose="high", content=f"[Worker.close] connection closed for worker {self.id}")
             except Exception:
                 pass
 
-    def assign_snapshot(self, total_amount: int):
-        self.snapshot = Snapshot(self.db, output=self.output, mode=self.mode, merge_www=self.merge_www)
+    def assign_snapshot(self, total_amount: int, snapshot: Snapshot = None):
+        """
+        Claim the next unhandled snapshot, or continue the given one (e.g. due for a retry).
+        """
+        if snapshot is None:
+            snapshot = Snapshot(self.db, output=self.output, mode=self.mode, merge_www=self.merge_www)
+        else:
+            snapshot.attach(self.db)
+        self.snapshot = snapshot
         self.total_amount = total_amount
         if not self.snapshot.counter:  # counter only if a row was fetched
             self.snapshot = None
             return
-        self.attempt = 1
+        self.attempt = self.snapshot.attempt + 1
+
+    def detach(self) -> "Worker":
+        """
+        Hand the assigned snapshot over to another thread (post-processing).
+
+        Returns a copy carrying the snapshot and its buffered messages, but no
+        connection or database. This worker continues without a snapshot and
+        with a fresh message buffer, so the messages stay bound to their snapshot.
+        """
+        detached = copy.copy(self)
+        detached.connection = None
+        detached.db = None
+        detached.message.worker = detached
+        self.message = Message(self)
+        self.snapshot = None
+        return detached
 
     def refresh_connection(self):
         """
         Refreshes the connection to the Wayback Machine.
         """
         self.connection.close()
-        self.connection = http.client.HTTPSConnection("web.archive.org")
+        self.connection = self.connect()
 
 
 class Message(Worker):
@@ -120,3 +156,44 @@ class Message(Worker):
         """
         vb.write(content=self.buffer)
         self.buffer = []
+
+
+class WorkerPool:
+    """
+    Workers shared by the jobs of a process which run one after another (see `Batch`).
+
+    A job takes its workers from the pool and gives them back at the end of its
+    download - the database of the job is closed, the connection to archive.org
+    stays open for the next job instead of being set up again for every job and
+    turn. Workers are kept by their id, a job with fewer workers takes the first.
+    """
+
+    def __init__(self):
+        self._workers = {}
+
+    def take(self, id: int, output: str, mode: str, merge_www: bool = True, timeout: float = None) -> Worker:
+        """
+        The worker with the given id, set up for the job.
+        """
+        worker = self._workers.get(id)
+        if worker is None:
+            worker = self._workers[id] = Worker(id=id, output=output, mode=mode, merge_www=merge_www, timeout=timeout)
+            return worker
+        if worker.timeout != timeout and worker.connection is not None:
+            worker.connection.close()  # connected with the timeout of another job
+            worker.connection = None
+        worker.output = output
+        worker.mode = mode
+        worker.merge_www = merge_www
+        worker.timeout = timeout
+        worker.snapshot = None
+        worker.message = Message(worker)
+        return worker
+
+    def close(self):
+        """
+        Close the connections of all workers.
+        """
+        for worker in self._workers.values():
+            worker.close()
+        self._workers = {}
@@ -1,20 +1,30 @@
-import gzip
 import http.client
 import os
+import queue
 import threading
 import time
 import urllib.parse
-from gzip import BadGzipFile
 from http import HTTPStatus
 from importlib.metadata import version
-from socket import timeout
 from urllib.parse import urljoin
 
+from pywaybackup.ContentCache import ContentCache
+from pywaybackup.db import Database
+from pywaybackup.Decoder import Decoder
 from pywaybackup.Exception import Exception as ex
+from pywaybackup.files import ManifestFile
+from pywaybackup.Health import Health
+from pywaybackup.Hedge import Hedge
+from pywaybackup.NegativeCache import NegativeCache
+from pywaybackup.Ranges import Ranges
+from pywaybackup.RateLimit import RateLimit
+from pywaybackup.Redirects import Redirects
+from pywaybackup.RetryQueue import RetryQueue
 from pywaybackup.helper import add_html_extension, check_nt, move_index, url_get_timestamp
 from pywaybackup.SnapshotCollection import SnapshotCollection
+from pywaybackup.Timeouts import Timeouts, TransferTimeout
 from pywaybackup.Verbosity import Verbosity as vb
-from pywaybackup.Worker import Worker
+from pywaybackup.Worker import Worker, WorkerPool
 
 
 class DownloadContext:
@@ -23,6 +33,8 @@ class DownloadContext:
 
     Attributes:
         snapshot_url (str): The URL of the snapshot to download.
+        target_url (str): The URL the body is fetched from, the end of the redirects if any.
+        local (bool): The body was read from a local copy instead of downloaded.
         headers (dict): HTTP headers for the request.
         encoded_download_url (str): URL-encoded snapshot URL.
         output_file (str): Path to the output file for the download.
@@ -30,6 +42,8 @@ class DownloadContext:
         response: HTTP response object.
         response_data: Raw response data.
         response_status (int): HTTP status code of the response.
+        content_type (str): Content-Type of the response.
+        mimetypes (tuple): Hints on the content type - cdx mimetype and Content-Type of the response.
     """
 
     def __init__(self, snapshot_url: str):
@@ -40,13 +54,20 @@ class DownloadContext:
             snapshot_url (str): The URL of the snapshot to download.
         """
         self.snapshot_url = snapshot_url
-        self.headers = {"User-Agent": f"bitdruid-python-wayback-downloader/{version('pywaybackup')}"}
+        self.target_url = snapshot_url
+        self.local = False
+        self.headers = {
+            "User-Agent": f"bitdruid-python-wayback-downloader/{version('pywaybackup')}",
+            "Accept-Encoding": Decoder.ACCEPT,
+        }
         self.encoded_download_url = self.encode_url(snapshot_url)
         self.output_file = None
         self.output_path = None
         self.response = None
         self.response_data = None
         self.response_status = None
+        self.content_type = None
+        self.mimetypes = ()
 
     def encode_url(self, url: str) -> str:
         """
@@ -67,6 +88,43 @@ class DownloadContext:
         return HTTPStatus(self.response_status).phrase if self.response_status else "No Status"
 
 
+class WriteBudget:
+    """
+    Caps the bytes of fetched snapshots waiting for the post-processing.
+
+    A worker takes the size of its body before handing it over and blocks while
+    the cap is reached, the post-processing gives it back once the file is
+    written. A slow disk then slows down the workers instead of filling the
+    memory. A single body larger than the cap still passes if nothing else is
+    in flight.
+
+    Attributes:
+        limit (int): Cap in bytes.
+        used (int): Bytes currently in flight.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int):
+        """
+        Take `size` bytes, waiting until they fit under the cap.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+
+    def release(self, size: int):
+        """
+        Give back `size` bytes and wake up the waiting workers.
+        """
+        with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+
 class DownloadArchive:
     """
     Manages the download process for a collection of snapshots using multiple workers.
@@ -78,7 +136,15 @@ class DownloadArchive:
         no_redirect (bool): If True, disables redirect handling.
         delay (int): Delay in seconds between downloads.
         workers (int): Number of worker threads to use.
+        postworkers (int): Number of post-processing threads, 0 to process in the worker threads.
+        buffer (int): Cap in bytes for fetched snapshots waiting for the post-processing.
+        queue_depth (multiprocessing.Value): Shared counter of snapshots waiting for the post-processing.
         sc (SnapshotCollection): The snapshot collection being processed.
+
+    The workers only fetch. A fetched snapshot is handed to the post-processing
+    (sniff, path, write) through a queue capped by bytes (see
+    `WriteBudget`), so the network reads do not wait for the file system and
+    both sides can be sized apart.
     """
 
     def __init__(
@@ -91,6 +157,20 @@ class DownloadArchive:
         wait: int,
         workers: int,
         merge_www: bool = True,
+        circuit: int = 10,
+        hedge: bool = False,
+        timeouts: Timeouts = None,
+        split: int = 0,
+        dead: NegativeCache = None,
+        content: ContentCache = None,
+        replace: bool = False,
+        manifest: ManifestFile = None,
+        rate: RateLimit = None,
+        turn: int = 0,
+        pool: WorkerPool = None,
+        postworkers: int = 1,
+        buffer: int = 64 * 1024 * 1024,
+        queue_depth=None,
     ):
         """
         Initialize the download manager with configuration options.
@@ -103,6 +183,20 @@ class DownloadArchive:
             delay (int): Delay between downloads in seconds.
             workers (int): Number of worker threads.
             merge_www (bool): Write www and non-www snapshots into the same folder.
+            circuit (int): Failures in a row after which all workers pause until archive.org answers (0: never).
+            hedge (bool): Send requests slower than nearly all others again on a second connection.
+            timeouts (Timeouts, optional): Limits for a single request (default: see `Timeouts`).
+            split (int): Cdx length in bytes from which a snapshot is fetched in parallel ranges (0: never).
+            dead (NegativeCache, optional): Stores the failed downloads for later runs.
+            content (ContentCache, optional): Bodies of earlier jobs, stores the downloaded ones.
+            replace (bool): Overwrite an existing output file if the downloaded content differs (sync of `last`).
+            manifest (ManifestFile, optional): Records the files added or changed.
+            rate (RateLimit, optional): Paces the requests, shared with other jobs of the process.
+            turn (int): Snapshots to claim per `run` before the workers stop and leave the rest unhandled (0: all).
+            pool (WorkerPool, optional): Workers and their connections shared with other jobs of the process.
+            postworkers (int): Number of post-processing threads (0: process in the worker threads).
+            buffer (int): Cap in bytes for fetched snapshots waiting for the post-processing.
+            queue_depth (multiprocessing.Value, optional): Counter to report the waiting snapshots to.
         """
         self.mode = mode
         self.output = output
@@ -112,20 +206,56 @@ class DownloadArchive:
         self.delay = delay
         self.wait = wait
         self.workers = workers
+        self.postworkers = postworkers
+        self.buffer = buffer
+        self.queue_depth = queue_depth
         self.sc = None
+        self._post_queue = None
+        self._budget = None
+        self._retry_queue = RetryQueue(base=wait)
+        self._health = Health(threshold=circuit, interval=wait)
+        self._hedge = Hedge() if hedge else None
+        self._timeouts = timeouts or Timeouts()
+        self._ranges = Ranges(threshold=split)
+        self._redirects = Redirects()
+        self._dead = dead
+        self._content = content
+        self._replace = replace
+        self._manifest = manifest
+        self._rate = rate
+        self._turn = turn
+        self._pool = pool
+        self._claims = 0
+        self._claims_lock = threading.Lock()
+        # folders known to exist below output, shared by the workers to skip the checks of planned snapshots
+        self._folders = set()
 
     def run(self, SnapshotCollection: SnapshotCollection):
         """
         Start the download process for the given snapshot collection.
 
+        With a `turn`, each call downloads the next `turn` snapshots of the
+        collection - the instance is kept for the turns of a batch job (see
+        `Batch`) with what it learned (redirects, folders, timings). Retries
+        not yet due at the end of a turn are dropped from the queue, the job
+        unlocks them and the next turn claims them again with their attempts.
+
         Args:
             SnapshotCollection (SnapshotCollection): The collection of snapshots to download.
         """
+        first = self.sc is None
         self.sc = SnapshotCollection
+        self._claims = 0
         if self.sc._snapshot_unhandled == 0:
             vb.write(content="\nNothing to download")
             return
+        if first:
+            db = Database()
+            self._redirects.load(db)  # also the copies of other selections, with no_redirect as well
+            db.close()
         self._spawn_workers()
+        if self._turn:
+            self._retry_queue.clear()
 
     def _spawn_workers(self):
         """
@@ -135,11 +265,27 @@ class DownloadArchive:
             content="\nDownloading snapshots...",
         )
         vb.progress(progress=0, maxval=self.sc._snapshot_total)
-        vb.progress(progress=self.sc._filter_skip)
+        vb.progress(progress=self.sc._snapshot_handled)
+
+        post_threads = []
+        if self.postworkers > 0:
+            # bounded by bytes - workers wait for the post-processing instead of piling up bodies in memory
+            self._post_queue = queue.Queue()
+            self._budget = WriteBudget(self.buffer)
+            for _ in range(self.postworkers):
+                thread = threading.Thread(target=self._post_loop, daemon=True)
+                post_threads.append(thread)
+                thread.start()
 
         threads = []
         for i in range(self.workers):
-            worker = Worker(id=i + 1, output=self.output, mode=self.mode, merge_www=self.merge_www)
+            worker = (self._pool.take if self._pool is not None else Worker)(
+                id=i + 1,
+                output=self.output,
+                mode=self.mode,
+                merge_www=self.merge_www,
+                timeout=self._timeouts.connect or None,
+            )
             vb.write(verbose=True, content=f"\n-----> Starting Worker: {worker.id}")
             thread = threading.Thread(target=self._download_loop, args=(worker,), daemon=True)
             threads.append(thread)
@@ -148,10 +294,30 @@ class DownloadArchive:
         for thread in threads:
             thread.join()
 
+        for _ in post_threads:
+            self._post_queue.put(None)
+        for thread in post_threads:
+            thread.join()
+        self._post_queue = None
+        self._ranges.close()
+
+        if self._content is not None and self._content.hits:
+            vb.write(content=f"\n{'from cache'.ljust(12)}: {self._content.hits}")
+        timeouts = self._timeouts.summary()
+        if timeouts:
+            vb.write(content=f"\n{'timeouts'.ljust(12)}: {timeouts}")
+
     def _download_loop(self, worker: Worker):
         """
         Main loop for a worker thread to process and download snapshots.
 
+        A failed snapshot is not retried in place - it goes to the retry queue and
+        the worker continues with the next snapshot. Retries due are taken first,
+        a worker with nothing else left waits for the queued ones. While archive.org
+        is unavailable (see `Health`) no snapshot is claimed and failures do not
+        count as attempts. With a `turn`, the workers claim that many unhandled
+        snapshots and leave the others for the next turn of the job.
+
         Args:
             worker (Worker): The worker instance handling downloads.
         """
@@ -159,119 +325,78 @@ class DownloadArchive:
             worker.init()
 
             while True:
-                worker.assign_snapshot(total_amount=self.sc._snapshot_total)
+                self._health.wait(worker)
+                snapshot = self._retry_queue.pop()
+                if snapshot is None and not self.__dl_claim():
+                    break  # turn is used up, retries not yet due are claimed again by the next turn
+                worker.assign_snapshot(total_amount=self.sc._snapshot_total, snapshot=snapshot)
                 if not worker.snapshot:
-                    break
+                    snapshot = self._retry_queue.wait()
+                    if snapshot is None:
+                        break
+                    self._health.wait(worker)
+                    worker.assign_snapshot(total_amount=self.sc._snapshot_total, snapshot=snapshot)
 
                 retry_max_attempt = max(self.retry, 1)
 
-                while worker.attempt <= retry_max_attempt:  # retry as given by user
-                    worker.message.store(
-                        verbose=True,
-                        content=(
+                worker.message.store(
+                    verbose=True,
+                    content=(
+                        f"\n-----> Worker: {worker.id}"
+                        f" - Attempt: [{worker.attempt}/{retry_max_attempt}]"
+                        f" Snapshot ID: [{worker.snapshot.counter}/{self.sc._snapshot_total}]"
+                    ),
+                )
+                download_status = False
+
+                try:
+                    download_status = self._download(worker=worker)
+
+                except (OSError, http.client.HTTPException) as e:
+                    # connection, tls and dns errors and timeouts (all OSError) - the connection may
+                    # hold a half-read response, the next snapshot needs a clean one
+                    worker.refresh_connection()
+                    self._ranges.keep(worker.snapshot, e)
+                    outage = self._health.failure()
+                    # connection errors are tried 3 times at least, as given by system
+                    reason = str(e) if isinstance(e, TransferTimeout) else e.__class__.__name__
+                    if not self.__dl_retry(worker, max(retry_max_attempt, 3), reason, count=not outage):
+                        self.__dl_failed(worker, status=e.__class__.__name__)
+                    continue
+                except Exception as e:
+                    ex.exception(
+                        message=(
                             f"\n-----> Worker: {worker.id}"
                             f" - Attempt: [{worker.attempt}/{retry_max_attempt}]"
                             f" Snapshot ID: [{worker.snapshot.counter}/{self.sc._snapshot_total}]"
+                            f" - EXCEPTION - {e}"
                         ),
+                        e=e,
                     )
-                    download_attempt = 1
-                    download_max_attempt = 3
-
-                    while download_attempt <= download_max_attempt:  # reconnect as given by system
-                        download_status = False
-
-                        try:
-                            download_status = self._download(worker=worker)
-
-                        except (
-                            timeout,
-                            ConnectionRefusedError,
-                            ConnectionResetError,
-                            http.client.HTTPException,
-                            Exception,
-                        ) as e:
-                            if isinstance(e, (timeout, ConnectionRefusedError, ConnectionResetError)):
-                                if download_attempt < download_max_attempt:
-                                    download_attempt += 1  # try again 2x with same connection
-                                    vb.write(
-                                        verbose=True,
-                                        content=(
-                                            f"\n-----> Worker: {worker.id}"
-                                            f" - Attempt: [{worker.attempt}/{retry_max_attempt}]"
-                                            f" Snapshot ID: [{worker.snapshot.counter}/{self.sc._snapshot_total}]"
-                                            f" - {e.__class__.__name__} - requesting again in 50 seconds..."
-                                        ),
-                                    )
-                                    vb.write(
-                                        verbose=False,
-                                        content=(
-                                            f"Worker: {worker.id}"
-                                            f" - Snapshot {worker.snapshot.counter}/{self.sc._snapshot_total}"
-                                            f" - requesting again in 50 seconds..."
-                                        ),
-                                    )
-                                    time.sleep(50)
-                                    continue
-
-                            elif isinstance(e, http.client.HTTPException):
-                                if download_attempt < download_max_attempt:
-                                    download_attempt = download_max_attempt  # try again 1x with new connection
-                                    vb.write(
-                                        verbose=True,
-                                        content=(
-                                            f"\n-----> Worker: {worker.id}"
-                                            f" - Attempt: [{worker.attempt}/{retry_max_attempt}]"
-                                            f" Snapshot ID: [{worker.snapshot.counter}/{self.sc._snapshot_total}]"
-                                            f" - {e.__class__.__name__} - renewing connection in {self.wait * download_attempt} seconds..."
-                                        ),
-                                    )
-                                    vb.write(
-                                        verbose=False,
-                                        content=(
-                                            f"Worker: {worker.id}"
-                                            f" - Snapshot {worker.snapshot.counter}/{self.sc._snapshot_total}"
-                                            f" - renewing connection in {self.wait * download_attempt} seconds..."
-                                        ),
-                                    )
-                                    time.sleep(self.wait * download_attempt)
-                                    worker.refresh_connection()
-                                    continue
-                            else:
-                                ex.exception(
-                                    message=(
-                                        f"\n-----> Worker: {worker.id}"
-                                        f" - Attempt: [{worker.attempt}/{retry_max_attempt}]"
-                                        f" Snapshot ID: [{worker.snapshot.counter}/{self.sc._snapshot_total}]"
-                                        f" - EXCEPTION - {e}"
-                                    ),
-                                    e=e,
-                                )
-                                worker.attempt = retry_max_attempt
-                                break
-
-                        if download_status:
-                            worker.message.write()
-                            worker.attempt = retry_max_attempt
-                            self.sc._snapshot_handled += 1
-                            vb.progress(1)
-                            break  # break all loops because of successful download
-
-                        # depends on user - retries after timeout or proceed to next snapshot
-                        if self.retry > 0:
-                            worker.message.store(
-                                verbose=True,
-                                result="FAILED",
-                                content=f"retry timeout: {self.wait * worker.attempt} seconds...",
-                            )
-                            worker.message.write()
-                            time.sleep(self.wait * worker.attempt)
-                        else:
-                            worker.message.store(verbose=None, result="FAILED", content="no attempt left")
-                            worker.message.write()
-                        self.sc._snapshot_handled += 1
-                        break  # break all loops and do a user-defined retry
-
-                    worker.attempt += 1
+                    if not self.__dl_retry(worker, retry_max_attempt, e.__class__.__name__):
+                        self.__dl_failed(worker, status=e.__class__.__name__)
+                    continue
+
+                # archive.org answered - a snapshot handed to the post-processing got a 200
+                status = 200 if download_status is None else worker.snapshot.response_status
+                outage = False
+                if Health.failed(status):
+                    outage = self._health.failure()
+                elif isinstance(status, int):
+                    self._health.success()
+
+                if download_status is None:
+                    pass  # handed to the post-processing, which reports the result
+
+                elif download_status:
+                    worker.message.write()
+                    self.__dl_journal(worker)
+                    self.sc._snapshot_handled += 1
+                    vb.progress(1)
+
+                # depends on user - retries later or proceed to next snapshot
+                elif not self.__dl_retry(worker, retry_max_attempt, "download failed", count=not outage):
+                    self.__dl_failed(worker)
 
                 if self.delay > 0:
                     vb.write(verbose=True, content=f"\n-----> Worker: {worker.id} - Delay: {self.delay} seconds")
@@ -280,7 +405,74 @@ class DownloadArchive:
         except Exception as e:
             ex.exception(f"\nWorker: {worker.id} - Exception", e)
         finally:
-            worker.close()
+            worker.close(keep_connection=self._pool is not None)
+
+    def __dl_retry(self, worker: Worker, max_attempt: int, reason: str, count: bool = True) -> bool:
+        """
+        Put the snapshot of the worker into the retry queue if it has attempts left.
+
+        The failed attempt is stored with the snapshot, the row stays locked until
+        the retry is due. An attempt failed during an outage does not count, the
+        snapshot is due again as soon as archive.org answers.
+
+        Args:
+            worker (Worker): The worker instance.
+            max_attempt (int): Attempts allowed for this kind of failure.
+            reason (str): Logged with the retry.
+            count (bool): Count the failed attempt against `max_attempt`.
+        Returns:
+            bool: True if the snapshot was queued, False if no attempt is left.
+        """
+        if count and worker.attempt >= max_attempt:
+            return False
+        attempt = worker.attempt if count else worker.attempt - 1
+        snapshot = worker.snapshot
+        snapshot.attempt = attempt
+        snapshot.response_status = "LOCK"
+        if count:
+            delay = self._retry_queue.put(snapshot, attempt)
+            content = f"{reason} - attempt {attempt}/{max_attempt} - again in {delay:.0f} seconds"
+        else:
+            self._retry_queue.put(snapshot, 0)
+            content = f"{reason} - archive.org unavailable - attempt not counted"
+        worker.message.store(verbose=None, result="RETRY", content=content)
+        worker.message.write()
+        worker.snapshot = None
+        return True
+
+    def __dl_failed(self, worker: Worker, status: str = None) -> None:
+        """
+        Give up the snapshot of the worker, its attempts are used up.
+
+        A snapshot without a response is stored with the error as its status -
+        the journal must not keep the LOCK of the claim, a resumed job takes
+        its rows as handled. The failure is stored in the negative cache once,
+        not per attempt.
+
+        Args:
+            worker (Worker): The worker instance.
+            status (str, optional): The error, if no response arrived.
+        """
+        if status is not None:
+            worker.snapshot.response_status = status
+        if self._dead is not None and not self._health.open:
+            self._dead.record(worker.snapshot.url_archive, worker.snapshot.response_status)
+        worker.message.store(verbose=None, result="FAILED", content="no attempt left")
+        worker.message.write()
+        self.__dl_journal(worker)
+        self.sc._snapshot_handled += 1
+
+    def __dl_claim(self) -> bool:
+        """
+        Count a claim of an unhandled snapshot, False once the turn is used up.
+        """
+        if not self._turn:
+            return True
+        with self._claims_lock:
+            if self._claims >= self._turn:
+                return False
+            self._claims += 1
+            return True
 
     def _download(self, worker: Worker):
         """
@@ -290,65 +482,214 @@ class DownloadArchive:
             worker (Worker): The worker instance handling the download.
         Returns:
             bool: True if download was successful, False otherwise.
+                None if the snapshot was handed to the post-processing, which reports the result.
         """
         context = DownloadContext(snapshot_url=worker.snapshot.url_archive)
 
-        self.__download_response(context=context, worker=worker)
-        worker.snapshot.response_status = context.response_status
-
-        if not self.no_redirect and context.response_status == 302:
-            self.__handle_redirect(context=context, worker=worker)
+        if not self.no_redirect and self._redirects.target(context.snapshot_url) is not None:
+            # redirected before - straight on to where it ended
+            context.response_status = 302
+            worker.snapshot.response_status = context.response_status
+            self.__handle_redirect(context=context, worker=worker, cached=True)
+        else:
+            if not self.__dl_local(context, worker):
+                self.__download_response(context=context, worker=worker)
+            worker.snapshot.response_status = context.response_status
+            if not self.no_redirect and context.response_status == 302:
+                self.__handle_redirect(context=context, worker=worker)
 
         if context.response_status == 200:
-            context.output_file = worker.snapshot.create_output()
-            context.output_file = add_html_extension(context.output_file, context.response_data)
-            context.output_path = os.path.dirname(context.output_file)
-
-            # if output_file is too long for windows, skip download
-            try:
-                self.__dl_nt_path_too_long(context, worker)
-            except Exception:
-                return False
+            context.mimetypes = (worker.snapshot.mimetype, context.content_type)
+            if self._post_queue is not None:
+                self._budget.acquire(len(context.response_data))
+                self.__queue_depth(1)
+                self._post_queue.put((context, worker.detach()))
+                return None
+            return self._process(context=context, worker=worker)
+        else:
+            return self.__dl_fail(context, worker)
 
-            # create path or move file if path exists as file or file exists as directory
-            self.__dl_move_path_or_file(context)
+    def _process(self, context: DownloadContext, worker: Worker) -> bool:
+        """
+        Write a fetched snapshot to its output file.
 
-            # download file if not existing
-            if not os.path.isfile(context.output_file):
-                with open(context.output_file, "wb") as file:
-                    file.write(context.response_data)
+        Runs in the worker thread or, handed over by `Worker.detach`, in a
+        post-processing thread. A downloaded body is also put into the content
+        cache, if there is one. The answer of the capture is final here, it is
+        stored in the negative cache (an empty body) or removes an entry there.
 
-                # check if file is downloaded
-                if os.path.isfile(context.output_file):
-                    return self.__dl_result(context, worker, "SUCCESS")
-            else:
-                return self.__dl_result(context, worker, "EXISTING")
+        Args:
+            context (DownloadContext): The download context with the response.
+            worker (Worker): The worker instance (or its detached copy).
+        Returns:
+            bool: True if the file was written or already exists, False otherwise.
+        """
+        if self._dead is not None:
+            self._dead.record(context.snapshot_url, 200, empty=not context.response_data)
+        if self._content is not None and not context.local:
+            self._content.put(context.target_url, context.response_data, context.content_type)
+        context.output_file = worker.snapshot.create_output()
+        if worker.snapshot.plan is None:
+            context.output_file = add_html_extension(context.output_file, context.response_data, context.mimetypes)
+        context.output_path = os.path.dirname(context.output_file)
+
+        # if output_file is too long for windows, skip download
+        try:
+            self.__dl_nt_path_too_long(context, worker)
+        except Exception:
+            return False
+
+        if worker.snapshot.plan is not None:
+            return self.__dl_planned(context, worker)
+
+        # create path or move file if path exists as file or file exists as directory
+        self.__dl_move_path_or_file(context)
+
+        # download file if not existing
+        if not os.path.isfile(context.output_file):
+            with open(context.output_file, "wb") as file:
+                file.write(context.response_data)
+
+            # check if file is downloaded
+            if os.path.isfile(context.output_file):
+                return self.__dl_result(context, worker, "SUCCESS", change="added")
+            return False
+        elif self._replace and self.__dl_replace(context):
+            return self.__dl_result(context, worker, "REPLACED", change="changed")
         else:
-            return self.__dl_fail(context, worker)
+            return self.__dl_result(context, worker, "EXISTING")
+
+    def _post_loop(self):
+        """
+        Loop of a post-processing thread: process the snapshots handed over by the
+        workers until the end marker (None) is queued.
+
+        Reports each snapshot the way the worker loop does - message, journal,
+        handled count. A snapshot which can not be written is not downloaded again.
+        """
+        db = Database()
+        try:
+            while True:
+                item = self._post_queue.get()
+                if item is None:
+                    break
+                context, worker = item
+                self.__queue_depth(-1)
+                size = len(context.response_data)
+                worker.db = db
+                worker.snapshot.attach(db)
+                try:
+                    status = self._process(context=context, worker=worker)
+                except Exception as e:
+                    ex.exception(
+                        message=(
+                            f"\n-----> Worker: {worker.id}"
+                            f" Snapshot ID: [{worker.snapshot.counter}/{self.sc._snapshot_total}]"
+                            f" - EXCEPTION - {e}"
+                        ),
+                        e=e,
+                    )
+                    status = False
+                context.response_data = None
+                self._budget.release(size)
+                if status:
+                    worker.message.write()
+                    vb.progress(1)
+                else:
+                    worker.message.store(verbose=None, result="FAILED", content="could not save file")
+                    worker.message.write()
+                self.__dl_journal(worker)
+                self.sc._snapshot_handled += 1
+        finally:
+            db.close()
 
-    def __handle_redirect(self, context: DownloadContext, worker: Worker) -> None:
+    def __queue_depth(self, change: int) -> None:
+        """
+        Report a snapshot entering (1) or leaving (-1) the post-processing queue.
+        """
+        if self.queue_depth is not None:
+            with self.queue_depth.get_lock():
+                self.queue_depth.value += change
+
+    def __handle_redirect(self, context: DownloadContext, worker: Worker, cached: bool = False) -> None:
         """
         Handle HTTP redirects for a snapshot download.
 
+        Follows the Location of the response up to 5 hops. A url with a known
+        chain (see `Redirects`) jumps straight to the capture the chain ended
+        on, a capture already written by the job is read from its file. A chain
+        ending on a capture is stored for the snapshots to come.
+
         Args:
             context (DownloadContext): The download context.
             worker (Worker): The worker instance.
+            cached (bool): The snapshot url has a known chain, nothing was requested yet.
         """
         worker.message.store(
             verbose=True, result="REDIRECT", content=f"{context.response_status} {context.response_status_message}"
         )
         worker.message.store(verbose=True, result="", info="FROM", content=context.snapshot_url)
+        url = context.snapshot_url
+        location = url if cached else None
+        hops = []
         for _ in range(5):
-            self.__download_response(context=context, worker=worker)
-            location = context.response.getheader("Location")
-            if location:
-                resolved_location = urljoin(context.snapshot_url, location)
-                context.encoded_download_url = context.encode_url(resolved_location)
+            if location is None:
+                location = context.response.getheader("Location")
+                if not location:
+                    break
                 worker.message.store(verbose=True, result="", info="TO", content=location)
-                worker.snapshot.redirect_timestamp = url_get_timestamp(resolved_location)
-                worker.snapshot.redirect_url = context.snapshot_url
-            else:
+                hops.append(url)
+            url = urljoin(url, location)
+            location = None
+            target = self._redirects.target(url)
+            if target is not None:
+                worker.message.store(verbose=True, result="", info="CACHED", content=target)
+                url = target
+            context.target_url = url
+            context.encoded_download_url = context.encode_url(url)
+            if self.__dl_local(context, worker):
                 break
+            self.__download_response(context=context, worker=worker)
+        if url != context.snapshot_url:
+            worker.snapshot.redirect_timestamp = url_get_timestamp(url)
+            worker.snapshot.redirect_url = context.snapshot_url
+        if hops and context.response_status == 200:
+            self._redirects.store(worker.db, hops, url)
+
+    def __dl_local(self, context: DownloadContext, worker: Worker) -> bool:
+        """
+        Take the body of the target url from a local copy instead of downloading it.
+
+        Either the file the job already wrote the target to (see `Redirects`) or
+        the body an earlier job stored in the content cache (see `ContentCache`).
+
+        Args:
+            context (DownloadContext): The download context.
+            worker (Worker): The worker instance.
+        Returns:
+            bool: True if the body was read from a local copy.
+        """
+        stored = self._redirects.local(context.target_url)
+        if stored is not None:
+            try:
+                with open(stored[0], "rb") as file:
+                    context.response_data = file.read()
+                context.content_type = stored[1]
+                source = stored[0]
+            except OSError:
+                stored = None
+        if stored is None and self._content is not None:
+            stored = self._content.get(context.target_url)
+            if stored is not None:
+                context.response_data, context.content_type = stored
+                source = "content cache"
+        if stored is None:
+            return False
+        context.response = None
+        context.response_status = 200
+        context.local = True
+        worker.message.store(verbose=True, result="", info="LOCAL", content=source)
+        return True
 
     def __dl_nt_path_too_long(self, context: DownloadContext, worker: Worker) -> None:
         """
@@ -366,6 +707,57 @@ class DownloadArchive:
             worker.file = "NT PATH TOO LONG TO SAVE FILE"
             raise Exception("NT Path too long to save file")
 
+    def __dl_planned(self, context: DownloadContext, worker: Worker) -> bool:
+        """
+        Write a snapshot with a planned output file (see `SnapshotCollection._plan_paths`).
+
+        The planning already resolved file and folder collisions, so the folder
+        is only checked the first time it is seen and an existing file is
+        detected by the exclusive open instead of another stat.
+
+        Args:
+            context (DownloadContext): The download context.
+            worker (Worker): The worker instance.
+        Returns:
+            bool: True if the file was written or already exists.
+        """
+        if context.output_path not in self._folders:
+            self.__dl_move_path_or_file(context)
+            self._folders.add(context.output_path)
+        try:
+            with open(context.output_file, "xb") as file:
+                file.write(context.response_data)
+        except FileExistsError:
+            if self._replace and self.__dl_replace(context):
+                return self.__dl_result(context, worker, "REPLACED", change="changed")
+            return self.__dl_result(context, worker, "EXISTING")
+        return self.__dl_result(context, worker, "SUCCESS", change="added")
+
+    def __dl_replace(self, context: DownloadContext) -> bool:
+        """
+        Overwrite an existing output file if the downloaded content differs from it.
+
+        A sync of `last` downloads the new newest capture of a file, which often
+        has the content of the previous one - that file is left as it is.
+
+        Args:
+            context (DownloadContext): The download context.
+        Returns:
+            bool: True if the file was replaced, False if the content is unchanged.
+        """
+        try:
+            if os.path.getsize(context.output_file) == len(context.response_data):
+                with open(context.output_file, "rb") as file:
+                    if file.read() == context.response_data:
+                        return False
+        except OSError:
+            pass
+        temp = f"{context.output_file}.{threading.get_ident()}"
+        with open(temp, "wb") as file:
+            file.write(context.response_data)
+        os.replace(temp, context.output_file)  # readers see the old or the new file, never a part
+        return True
+
     def __dl_move_path_or_file(self, context: DownloadContext) -> None:
         """
         Handle cases where output path is a file or output file is a directory.
@@ -380,9 +772,13 @@ class DownloadArchive:
             os.makedirs(context.output_path, exist_ok=True)
         # case if output_file is a directory, create file as index.html in this directory
         if os.path.isdir(context.output_file):
-            context.output_file = move_index(existfile=context.output_file, filebuffer=context.response_data)
+            context.output_file = move_index(
+                existfile=context.output_file,
+                filebuffer=context.response_data,
+                mimetypes=context.mimetypes,
+            )
 
-    def __dl_result(self, context: DownloadContext, worker: Worker, result: str) -> bool:
+    def __dl_result(self, context: DownloadContext, worker: Worker, result: str, change: str = None) -> bool:
         """
         Store result information and update snapshot file path.
 
@@ -390,6 +786,7 @@ class DownloadArchive:
             context (DownloadContext): The download context.
             worker (Worker): The worker instance.
             result (str): Result status ('SUCCESS', 'EXISTING', etc.).
+            change (str, optional): Change of the output file for the manifest ('added', 'changed').
         Returns:
             bool: Always True (indicates result was processed).
         """
@@ -400,8 +797,34 @@ class DownloadArchive:
         worker.message.store(verbose=True, result="", info="URL", content=context.snapshot_url)
         worker.message.store(verbose=True, result="", info="FILE", content=context.output_file)
         worker.snapshot.file = context.output_file
+        if self._manifest is not None and change:
+            snapshot = worker.snapshot
+            self._manifest.append(
+                [change, snapshot.timestamp, snapshot.url_archive, snapshot.url_origin, snapshot.file]
+            )
+        self._redirects.written(worker.db, context.target_url, context.output_file, context.content_type)
         return True
 
+    def __dl_journal(self, worker: Worker) -> None:
+        """
+        Append the current state of the worker's snapshot to the csv journal.
+
+        Args:
+            worker (Worker): The worker instance.
+        """
+        snapshot = worker.snapshot
+        self.sc.csvfile.append(
+            [
+                snapshot.timestamp,
+                snapshot.url_archive,
+                snapshot.url_origin,
+                snapshot.redirect_url,
+                snapshot.redirect_timestamp,
+                snapshot.response_status,
+                snapshot.file,
+            ]
+        )
+
     def __dl_fail(self, context: DownloadContext, worker: Worker) -> bool:
         """
         Handle failed download attempts and store failure information.
@@ -422,21 +845,28 @@ class DownloadArchive:
         """
         Send HTTP GET request and store response data in the context.
 
+        The request is bound by the `Timeouts`. Large snapshots and those with a
+        body left by an interrupted attempt are fetched by ranges (see `Ranges`),
+        others with hedging are sent again on a second connection if they take
+        too long (see `Hedge`).
+
         Args:
             context (DownloadContext): The download context.
             worker (Worker): The worker instance.
         """
-        worker.connection.request("GET", context.encoded_download_url, headers=context.headers)
-        context.response = worker.connection.getresponse()
-        context.response_data = context.response.read()
-        context.response_status = context.response.status
 
-        # decompress before sniff
-        if context.response.getheader("Content-Encoding") == "gzip":
-            try:
-                context.response_data = gzip.decompress(context.response_data)
-            except BadGzipFile:
-                vb.write(
-                    verbose=None,
-                    content=f"Worker: {worker.id} - GZIP DECOMPRESS SKIPPED - {context.snapshot_url}",
-                )
+        def send(connection, headers: dict = None):
+            headers = {**context.headers, **headers} if headers else context.headers
+            if self._rate is not None:
+                self._rate.acquire()
+            return self._timeouts.send(connection, "GET", context.encoded_download_url, headers)
+
+        if self._ranges.wanted(worker.snapshot):
+            context.response, context.response_data = self._ranges.fetch(worker, worker.snapshot, send)
+        elif self._hedge is not None:
+            context.response, context.response_data = self._hedge.fetch(worker, send)
+        else:
+            context.response, context.response_data = send(worker.connection)
+        worker.snapshot.partial = b""
+        context.response_status = context.response.status
+        context.content_type = context.response.getheader("Content-Type")
@@ -35,6 +35,7 @@ def build_parser() -> argparse.ArgumentParser:
     optional.add_argument("--limit", type=int, nargs="?", const=True, metavar="int", help="limit the number of snapshots to download")
     optional.add_argument("--filetype", type=str, metavar="", help="filetypes to download comma separated (js,css,...)")
     optional.add_argument("--statuscode", type=str, metavar="", help="statuscodes to download comma separated (200,404,...)")
+    optional.add_argument("-i", "--input", type=str, metavar="", help="file (- for stdin) listing the captures to download instead of a cdx query (text, csv or jsonl)")
 
     behavior = parser.add_argument_group("manipulate behavior")
     behavior.add_argument("-o", "--output", type=str, metavar="", help="output for all files - defaults to current directory")
@@ -46,12 +47,32 @@ def build_parser() -> argparse.ArgumentParser:
     behavior.add_argument("--no-merge-www", action="store_true", help="keep www and non-www snapshots in separate folders")
     behavior.add_argument("--retry", type=int, default=0, metavar="", help="retry failed downloads (opt tries as int, else infinite)")
     behavior.add_argument("--workers", type=int, default=1, metavar="", help="number of workers (simultaneous downloads)")
+    behavior.add_argument("--postworkers", type=int, default=1, metavar="", help="number of threads writing downloaded snapshots (0: written by the workers)")
+    behavior.add_argument("--buffer", type=int, default=64, metavar="", help="megabytes of downloaded snapshots held for writing before the workers wait (default: 64)")
     behavior.add_argument("--delay", type=int, default=0, metavar="", help="delay between each download in seconds")
-    behavior.add_argument("--wait", type=int, default=15, metavar="", help="seconds to wait before renewing connection after HTTP errors or snapshot download errors (default: 15)")
+    behavior.add_argument("--rate", type=float, default=0, metavar="", help="requests per second to archive.org, for all workers and batch jobs together (default: 0, none)")
+    behavior.add_argument("--wait", type=int, default=15, metavar="", help="seconds to wait before retrying a failed snapshot, doubled per attempt (default: 15)")
+    behavior.add_argument("--timeout", type=int, default=30, metavar="", help="seconds to connect, to wait for a response and between two reads of it (default: 30, 0: none)")
+    behavior.add_argument("--deadline", type=int, default=0, metavar="", help="seconds for a whole download (default: 0, none)")
+    behavior.add_argument("--min-rate", type=int, default=0, metavar="", help="abort downloads slower than this many bytes per second (default: 0, none)")
+    behavior.add_argument("--split", type=int, default=0, metavar="", help="megabytes from which a snapshot is downloaded in parallel parts (default: 0, never)")
+    behavior.add_argument("--hedge", action="store_true", help="send downloads slower than nearly all recent ones again on a second connection")
+    behavior.add_argument("--order", type=str, default="cdx", choices=["cdx", "size", "html", "depth", "newest"], metavar="", help="download order: cdx, size, html, depth, newest (default: cdx)")
+    behavior.add_argument("--cache", type=str, metavar="", help="directory of the caches shared by all jobs (default: ~/.cache/pywaybackup)")
+    behavior.add_argument("--dead-ttl", type=int, default=7, metavar="", help="days a snapshot which failed is skipped by later jobs (default: 7, 0: always try)")
+    behavior.add_argument("--recheck", action="store_true", help="download snapshots which failed in earlier jobs anyway")
+    behavior.add_argument("--content-cache", type=int, default=0, metavar="", help="megabytes of downloaded snapshots kept in the cache, so later jobs do not download them again (default: 0, none)")
+    behavior.add_argument("--cdx-ttl", type=int, default=0, metavar="", help="days a cdx result is kept in the cache to answer the same or a narrower query (default: 0, none)")
+    behavior.add_argument("--circuit", type=int, default=10, metavar="", help="failures in a row after which all workers pause until archive.org answers again (default: 10, 0: never)")
 
     special = parser.add_argument_group("special")
     special.add_argument("--reset", action="store_true", help="reset the job and ignore existing cdx/db/csv files")
     special.add_argument("--keep", action="store_true", help="keep all files after the job finished")
+    special.add_argument("--sync", action="store_true", help="keep the job for the next run, which then only downloads captures newer than the last complete run")
+    special.add_argument("--compact", action="store_true", help="rewrite the csv from the database after the job (one row per snapshot)")
+    special.add_argument("--batch", type=str, metavar="", help="file (- for stdin) with a job per line - a url or a json object of arguments, the others apply to all jobs")
+    special.add_argument("--batch-turn", type=int, default=100, metavar="", help="snapshots a batch job downloads before the next job takes over (default: 100, 0: each job to its end)")
+    special.add_argument("--memory", action="store_true", help="keep the job database in memory (fast for small jobs, written to disk only if interrupted)")
 
     return parser
 
@@ -1,21 +1,29 @@
+import os
+import sqlite3
+import threading
+
 from sqlalchemy import (  # noqa: F401
     Column,
     Index,
     Integer,
     String,
+    UniqueConstraint,
     and_,
     bindparam,
+    column,
     create_engine,
     delete,
     func,
     insert,
     or_,
     select,
+    table,
     text,
     tuple_,
     update,
 )
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
 from typing import Optional  # python 3.8
 from pywaybackup.Verbosity import Verbosity as vb
 
@@ -45,19 +53,83 @@ class waybackup_job(Base):
     filter_complete = Column(Integer)
 
 
+class waybackup_hosts(Base):
+    """
+    SQLAlchemy ORM model for the 'waybackup_hosts' table.
+
+    Interns the host part of the origin urls (see `split_origin`). A job spans
+    a handful of hosts, so the snapshots only carry the id.
+
+    Attributes:
+        hid (int): Host ID (primary key).
+        host (str): Scheme and host of an origin url as given by the cdx (e.g. 'https://www.example.com').
+    """
+
+    __tablename__ = "waybackup_hosts"
+
+    hid = Column(Integer, primary_key=True)
+    host = Column(String, unique=True, nullable=False)
+
+
+class waybackup_keys(Base):
+    """
+    SQLAlchemy ORM model for the 'waybackup_keys' table.
+
+    Interns the url keys. Every timestamp of a file shares the same key, so the
+    snapshots only carry the id and the mode filter partitions by an integer.
+
+    Attributes:
+        kid (int): Key ID (primary key).
+        url_key (str): Output path the url maps to, relative to the output dir (see Url.key).
+    """
+
+    __tablename__ = "waybackup_keys"
+
+    kid = Column(Integer, primary_key=True)
+    url_key = Column(String, unique=True, nullable=False)
+
+
+class waybackup_mimetypes(Base):
+    """
+    SQLAlchemy ORM model for the 'waybackup_mimetypes' table.
+
+    Interns the mimetypes reported by the cdx server. A job only sees a few
+    dozen, so the snapshots only carry the id.
+
+    Attributes:
+        mid (int): Mimetype ID (primary key).
+        mimetype (str): Mimetype as given by the cdx (e.g. 'text/html', 'warc/revisit').
+    """
+
+    __tablename__ = "waybackup_mimetypes"
+
+    mid = Column(Integer, primary_key=True)
+    mimetype = Column(String, unique=True, nullable=False)
+
+
 class waybackup_snapshots(Base):
     """
     SQLAlchemy ORM model for the 'waybackup_snapshots' table.
 
     Stores information about individual snapshots.
 
+    Kept compact for jobs with millions of rows: the origin is stored as interned
+    host and the remaining path, the key is interned, the timestamp is an integer
+    and the archive url is not stored at all - it is derived from timestamp and
+    origin. Read the derived values through `waybackup_snapshot_rows`.
+
     Attributes:
         scid (int): Snapshot collection ID (primary key).
         counter (int): Counter for snapshot ordering or grouping.
-        timestamp (str): Timestamp of the snapshot.
-        url_archive (str): Unique URL of the archived snapshot.
-        url_origin (str): Original URL before archiving.
-        url_key (str): Output path the url maps to, relative to the output dir (see Url.key).
+        timestamp (int): Timestamp of the snapshot (YYYYMMDDhhmmss).
+        hid (int): Host of the original url (see waybackup_hosts).
+        origin_path (str): Original url without its host part.
+        kid (int): Output path the url maps to (see waybackup_keys).
+        mid (int): Mimetype reported by the cdx (see waybackup_mimetypes).
+        length (int): Size of the archived record reported by the cdx, if queried.
+        plan (int): How the output path is written, decided before the download (see helper.plan_output).
+        attempt (int): Failed attempts so far, kept for a resumed job (see RetryQueue).
+        priority (int): Download order, lowest first (see SnapshotCollection.ORDERS).
         redirect_url (str): URL to which the original was redirected, if any.
         redirect_timestamp (str): Timestamp of the redirect, if applicable.
         response (str): HTTP response or status for the snapshot.
@@ -65,19 +137,133 @@ class waybackup_snapshots(Base):
     """
 
     __tablename__ = "waybackup_snapshots"
+    # a capture is identified by timestamp and origin - replaces the unique url_archive
+    __table_args__ = (UniqueConstraint("timestamp", "hid", "origin_path"),)
 
     scid = Column(Integer, primary_key=True)
     counter = Column(Integer)
-    timestamp = Column(String)
-    url_archive = Column(String, unique=True)
-    url_origin = Column(String)
-    url_key = Column(String)
+    timestamp = Column(Integer)
+    hid = Column(Integer)
+    origin_path = Column(String)
+    kid = Column(Integer)
+    mid = Column(Integer)
+    length = Column(Integer)
+    plan = Column(Integer)
+    attempt = Column(Integer)
+    priority = Column(Integer)
     redirect_url = Column(String)
     redirect_timestamp = Column(String)
     response = Column(String)
     file = Column(String)
 
 
+class waybackup_redirects(Base):
+    """
+    SQLAlchemy ORM model for the 'waybackup_redirects' table.
+
+    Redirect chains the downloads of the job resolved (see Redirects). Every url
+    of a chain points to the capture the chain ended on. Once that capture was
+    written, it gets a row of its own (url and target equal) with its file.
+
+    Attributes:
+        url (str): Archive url which redirected (primary key).
+        target (str): Archive url of the capture the chain ended on.
+        file (str): File the target was written to, only on the row of the target itself.
+        content_type (str): Content-Type the target was served with.
+    """
+
+    __tablename__ = "waybackup_redirects"
+
+    url = Column(String, primary_key=True)
+    target = Column(String, nullable=False)
+    file = Column(String)
+    content_type = Column(String)
+
+
+class waybackup_sync(Base):
+    """
+    SQLAlchemy ORM model for the 'waybackup_sync' table.
+
+    State of a job run with `--sync`. A run which handled all snapshots marks the
+    job complete, the next run then only queries the captures from `newest` on.
+
+    Attributes:
+        query_identifier (str): Identifier of the job (primary key).
+        newest (str): Newest cdx timestamp inserted into the job.
+        complete (int): 1 once a run handled all snapshots, 0 while a later run merges new captures,
+            NULL during the first run.
+    """
+
+    __tablename__ = "waybackup_sync"
+
+    query_identifier = Column(String, primary_key=True)
+    newest = Column(String)
+    complete = Column(Integer)
+
+
+# snapshots with the interned and derived values resolved, as they were stored before
+_SNAPSHOT_ROWS_VIEW = (
+    "CREATE VIEW IF NOT EXISTS waybackup_snapshot_rows AS SELECT "
+    "s.scid AS scid, "
+    "s.counter AS counter, "
+    "CAST(s.timestamp AS TEXT) AS timestamp, "
+    "'https://web.archive.org/web/' || s.timestamp || 'id_/' || h.host || s.origin_path AS url_archive, "
+    "h.host || s.origin_path AS url_origin, "
+    "k.url_key AS url_key, "
+    "m.mimetype AS mimetype, "
+    "s.length AS length, "
+    "s.plan AS plan, "
+    "s.attempt AS attempt, "
+    "s.redirect_url AS redirect_url, "
+    "s.redirect_timestamp AS redirect_timestamp, "
+    "s.response AS response, "
+    "s.file AS file "
+    "FROM waybackup_snapshots s "
+    "JOIN waybackup_hosts h ON h.hid = s.hid "
+    "JOIN waybackup_keys k ON k.kid = s.kid "
+    "LEFT JOIN waybackup_mimetypes m ON m.mid = s.mid"
+)
+
+waybackup_snapshot_rows = table(
+    "waybackup_snapshot_rows",
+    column("scid"),
+    column("counter"),
+    column("timestamp"),
+    column("url_archive"),
+    column("url_origin"),
+    column("url_key"),
+    column("mimetype"),
+    column("length"),
+    column("plan"),
+    column("attempt"),
+    column("redirect_url"),
+    column("redirect_timestamp"),
+    column("response"),
+    column("file"),
+)
+
+
+def split_origin(origin: str) -> tuple:
+    """
+    Split an origin url into its host part and the rest, as stored in the snapshot table.
+
+    The host part is everything up to the first `/` after the scheme, kept as
+    given by the cdx (scheme, case, port). Concatenating both parts gives back
+    the origin unchanged.
+
+    Args:
+        origin (str): Original url of a snapshot.
+    Returns:
+        tuple: (host, path)
+    """
+    start = origin.find("://")
+    start = start + 3 if start >= 0 else 0
+    slash = origin.find("/", start)
+    if slash < 0:
+        return origin, ""
+    return origin[:slash], origin[slash:]
+
+
 class Database:
     """
     Database manager for waybackup jobs and snapshots.
@@ -89,42 +275,133 @@ class Database:
         dbfile (str): Path to the SQLite database file.
         query_identifier (str): Identifier for the current job/query.
         query_exist (bool): Whether the job already exists in the database.
+        query_replaced (bool): Whether the database held the snapshots of another selection, which were dropped.
         sessman (sessionmaker): SQLAlchemy session factory.
         query_progress (str): Progress string for the current job.
+        memory (bool): Whether the database lives in memory instead of the dbfile.
+
+    The ORM is used for the schema and the one-off phases (insert, index, filter).
+    The per-snapshot hot path (claim, update, count) runs on a plain sqlite3
+    connection instead, see `raw`.
     """
 
     dbfile = None
     query_identifier = None
     query_exist = False
+    query_replaced = False
     engine = None
     sessman = sessionmaker()
     query_progress = "0 / 0"
+    memory = False
+
+    # single connection of an in-memory database, shared by all sessions and instances
+    _memory_connection = None
+
+    # raw connections handed out by instances, closed together with the engine
+    _raw_connections = []
+    _raw_lock = threading.Lock()
 
     @classmethod
-    def init(cls, dbfile, query_identifier):
+    def init(cls, dbfile, query_identifier, memory: bool = False):
         """
         Initialize the database connection and ensure job entry exists.
 
+        With `memory` the database is kept in memory. Small jobs then skip the file
+        creation and the disk syncs of every commit. An existing dbfile (from an
+        interrupted run) is loaded, `save()` writes the database back for a resume.
+
         Args:
             dbfile (str): Path to the SQLite database file.
             query_identifier (str): Unique identifier for the job/query.
+            memory (bool): Keep the database in memory instead of the dbfile.
         """
         cls.dbfile = dbfile
         cls.query_identifier = query_identifier
-        cls.engine = create_engine(f"sqlite:///{dbfile}")
+        cls.memory = memory
+        # set per job, a batch runs several jobs in one process
+        cls.query_exist = False
+        cls.query_replaced = False
+        cls.query_progress = "0 / 0"
+        if memory:
+            # an in-memory database exists per connection, so every session and raw user shares one
+            cls.engine = create_engine(
+                "sqlite://",
+                poolclass=StaticPool,
+                connect_args={"check_same_thread": False, "isolation_level": None},
+            )
+            cls._memory_connection = cls.engine.raw_connection().driver_connection
+            if os.path.exists(dbfile):
+                source = sqlite3.connect(dbfile)
+                source.backup(cls._memory_connection)
+                source.close()
+        else:
+            cls.engine = create_engine(f"sqlite:///{dbfile}")
         cls.sessman = sessionmaker(bind=cls.engine)
+        cls._drop_legacy()
         Base.metadata.create_all(cls.engine)
 
         db = Database()
+        db.session.execute(text(_SNAPSHOT_ROWS_VIEW))
         if db.session.execute(
             select(waybackup_job.query_identifier).where(waybackup_job.query_identifier == query_identifier)
         ).fetchone():
             cls.query_exist = True
             cls.query_progress = db.get_progress()
         else:
+            cls.query_replaced = db._drop_selection()
             db.session.execute(insert(waybackup_job).values(query_identifier=query_identifier))
         db.close()
 
+    def _drop_selection(self) -> bool:
+        """
+        Drop the snapshots of another job on the same url (another mode or filters).
+
+        The database holds the state of one selection - the mode filter deletes
+        rows, responses and files belong to its paths. The snapshots are inserted
+        again from the listing of the new job, the resolved redirects stay as they
+        do not depend on the selection.
+
+        Returns:
+            bool: True if another job was dropped.
+        """
+        if self.session.execute(select(waybackup_job.query_identifier)).first() is None:
+            return False
+        vb.write(verbose=True, content="\n[Database] dropping the snapshots of another selection on this url")
+        for model in (waybackup_snapshots, waybackup_sync, waybackup_job):
+            self.session.execute(delete(model))
+        self.session.commit()
+        return True
+
+    @classmethod
+    def _drop_legacy(cls):
+        """
+        Drop a snapshot table written by another version (e.g. before the compact layout).
+
+        Such a job can not be resumed in place. The tables are dropped and the job
+        is rebuilt from the cdx file, the csv file restores what was already handled.
+        """
+        with cls.engine.begin() as connection:
+            columns = {row[1] for row in connection.execute(text("PRAGMA table_info(waybackup_snapshots)"))}
+            if not columns or columns == set(waybackup_snapshots.__table__.columns.keys()):
+                return
+            vb.write(verbose=None, content="\nExisting job database has an outdated layout - rebuilding it")
+            connection.execute(text("DROP VIEW IF EXISTS waybackup_snapshot_rows"))
+            connection.execute(text("DROP TABLE waybackup_snapshots"))
+            connection.execute(text("DELETE FROM waybackup_jobs"))
+
+    @classmethod
+    def save(cls):
+        """
+        Write an in-memory database to the dbfile, so an interrupted job can resume from it.
+
+        No-op for a database that lives in the dbfile anyway.
+        """
+        if not cls.memory or cls._memory_connection is None:
+            return
+        target = sqlite3.connect(cls.dbfile)
+        cls._memory_connection.backup(target)
+        target.close()
+
     @classmethod
     def close_engine(cls):
         """
@@ -134,15 +411,45 @@ class Database:
         holds an exclusive lock on open files. No-op on platforms where this
         isn't required, and idempotent if called more than once.
         """
+        with cls._raw_lock:
+            for connection in cls._raw_connections:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            cls._raw_connections = []
         if cls.engine is not None:
             cls.engine.dispose()
             cls.engine = None
+        cls._memory_connection = None
 
     def __init__(self):
         """
         Create a new session.
         """
         self.session = self.sessman()
+        self._raw = None
+
+    @property
+    def raw(self) -> Optional[sqlite3.Connection]:
+        """
+        sqlite3.Connection or None: Plain sqlite3 connection of this instance, opened on first use.
+
+        Skips statement compilation and session bookkeeping of the ORM. The sqlite3
+        module caches prepared statements per connection by their sql text, so the
+        hot path keeps its sql as constant strings and only binds parameters.
+
+        Runs in autocommit mode - every statement is its own transaction, same as the
+        execute-and-commit the ORM path does. None if the engine is not sqlite.
+        An in-memory database hands out its shared connection instead.
+        """
+        if self.memory:
+            return self._memory_connection
+        if self._raw is None and self.engine is not None and self.engine.dialect.name == "sqlite":
+            self._raw = sqlite3.connect(self.dbfile, timeout=30, isolation_level=None, check_same_thread=False)
+            with self._raw_lock:
+                self._raw_connections.append(self._raw)
+        return self._raw
 
     def close(self):
         """
@@ -167,6 +474,22 @@ class Database:
                 vb.write(verbose="high", content="[Database.close] session closed")
             except Exception as e:
                 vb.write(verbose="high", content=f"[Database.close] session close failed: {e}")
+            self._close_raw()
+
+    def _close_raw(self):
+        """
+        Close the raw sqlite3 connection of this instance, if one was opened.
+        """
+        if self._raw is None:
+            return
+        with self._raw_lock:
+            if self._raw in self._raw_connections:
+                self._raw_connections.remove(self._raw)
+        try:
+            self._raw.close()
+        except Exception:
+            pass
+        self._raw = None
 
     def write_progress(self, done: int, total: int):
         """
@@ -248,3 +571,44 @@ class Database:
             .values(filter_complete=1)
         )
         self.session.commit()
+
+    def get_sync(self) -> tuple:
+        """
+        tuple: (newest, complete) of the job's sync state, (None, None) if the job was never synced.
+        """
+        row = self.session.execute(
+            select(waybackup_sync.newest, waybackup_sync.complete).where(
+                waybackup_sync.query_identifier == self.query_identifier
+            )
+        ).fetchone()
+        return tuple(row) if row else (None, None)
+
+    def set_sync(self, newest: Optional[str] = None, complete: Optional[int] = None):
+        """
+        Update the job's sync state, values left None are kept.
+
+        Args:
+            newest (str): Newest cdx timestamp inserted, kept if older than the stored one.
+            complete (int): 1 if the run handled all snapshots, 0 while a later run merges new captures.
+        """
+        stored, done = self.get_sync()
+        if newest is not None and stored is not None and newest < stored:
+            newest = stored
+        values = {
+            "query_identifier": self.query_identifier,
+            "newest": stored if newest is None else newest,
+            "complete": done if complete is None else complete,
+        }
+        self.session.execute(insert(waybackup_sync).prefix_with("OR REPLACE").values(**values))
+        self.session.commit()
+
+    def reset_phases(self):
+        """
+        Mark the insertion and filtering phases as incomplete, so new cdx rows are merged into the job.
+        """
+        self.session.execute(
+            update(waybackup_job)
+            .where(waybackup_job.query_identifier == self.query_identifier)
+            .values(insert_complete=0, filter_complete=0)
+        )
+        self.session.commit()
@@ -3,10 +3,19 @@ from typing import List, Optional  # 3.8
 
 import os
 import csv
+import hashlib
+import itertools
+import json
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import time
 import requests
 from datetime import datetime
 from pywaybackup.Url import Url
-from pywaybackup.db import Database, waybackup_snapshots, select
+from pywaybackup.db import Database, select, waybackup_snapshot_rows
 from pywaybackup.Verbosity import Verbosity as vb, Progressbar
 from pywaybackup.Exception import Exception as ex
 
@@ -34,22 +43,32 @@ class CDXquery:
         self.domain, self.subdir, self.filename = url.domain_raw, url.subdir, url.filename_raw
         self.query_url = self._build_query()
 
-    def _build_query(self):
+    @property
+    def target(self) -> str:
+        """
+        str: The queried url (domain, subdir, filename) without the wildcard.
+        """
+        target = self.domain or ""
+        if self.subdir:
+            target += f"/{self.subdir}"
+        if self.filename:
+            target += f"/{self.filename}"
+        return target
+
+    @property
+    def period(self) -> tuple:
+        """
+        tuple: The `from` and `to` timestamps of the query as given, None if open.
+        """
         if self.range:
-            period = f"&from={datetime.now().year - self.range}"
-        else:
-            period = ""
-            if self.start:
-                period += f"&from={self.start}"
-            if self.end:
-                period += f"&to={self.end}"
+            return str(datetime.now().year - self.range), None
+        return (str(self.start) if self.start else None), (str(self.end) if self.end else None)
 
-        cdx_url = self.domain or ""
+    def _build_query(self):
+        first, last = self.period
+        period = (f"&from={first}" if first else "") + (f"&to={last}" if last else "")
 
-        if self.subdir:
-            cdx_url += f"/{self.subdir}"
-        if self.filename:
-            cdx_url += f"/{self.filename}"
+        cdx_url = self.target
         if not self.explicit:
             cdx_url += "/*"
 
@@ -64,7 +83,7 @@ class CDXquery:
             f"https://web.archive.org/cdx/search/cdx?"
             f"output=json"
             f"&url={cdx_url}{period}"
-            f"&fl=timestamp,digest,mimetype,statuscode,original"
+            f"&fl=timestamp,digest,mimetype,statuscode,original,length"
             f"{limit}"
             f"{filter_filetype}"
             f"{filter_statuscode}"
@@ -122,10 +141,14 @@ class CDXfile(File):
         self._open(mode="r")
         return iter(self._file_handler)
 
-    def request_snapshots(self, query: CDXquery):
+    def request_snapshots(self, query: CDXquery, cache: "CDXcache" = None, listings: "CDXcache" = None):
         try:
             if not self._new:
                 return True
+            elif listings is not None and listings.answer(query, self.filepath):
+                return True
+            elif cache is not None and cache.answer(query, self.filepath):
+                return True
             else:
                 with open(self.filepath, "w", encoding="utf-8") as cdxfile_io:
                     with requests.get(query.query_url, stream=True, timeout=60) as r:
@@ -136,6 +159,8 @@ class CDXfile(File):
                                 progress.update(len(chunk))
                                 cdxfile_io.write(chunk.decode("utf-8"))
 
+                if cache is not None:
+                    cache.store(query, self.filepath)
                 return True
 
         except requests.exceptions.ConnectionError:
@@ -157,9 +182,211 @@ class CDXfile(File):
         return count
 
 
+class CDXcache:
+    """
+    Cdx results of earlier jobs, shared by all jobs on the host.
+
+    A result is stored by its normalized query (see `scope`) below `cdx/` in
+    the cache directory and answers for `ttl` days - not only the same query,
+    but every narrower one: a subdir or file below a wildcard query, a part of
+    its time range, a subset of its filetypes or statuscodes. The rows of a
+    narrower query are filtered from the stored result as the cdx server
+    would have, so slicing a site listed before costs no second cdx download.
+    A result with a limit only answers its own query.
+
+    Also kept per metadata directory as the listings of the kept jobs (see
+    `PyWayBackup._f_keep`), so another selection on a listed url - other mode,
+    narrower filters - does not query it again.
+
+    Attributes:
+        path (str): Directory of the cache.
+        ttl (float): Days a stored result is used, None to keep it until it is replaced.
+        name (str): Name of the index file (`<name>.db`) and the folder of the results.
+        label (str): What the results are called in the output.
+    """
+
+    _SQL_CREATE = (
+        "CREATE TABLE IF NOT EXISTS cdx (key TEXT PRIMARY KEY, domain TEXT NOT NULL, name TEXT NOT NULL, created REAL)"
+    )
+    _SQL_FIND = "SELECT key, name FROM cdx WHERE domain = ? AND created >= ?"
+    _SQL_EXPIRED = "SELECT key, name FROM cdx WHERE created < ?"
+    _SQL_STORE = "INSERT OR REPLACE INTO cdx (key, domain, name, created) VALUES (?, ?, ?, ?)"
+    _SQL_DELETE = "DELETE FROM cdx WHERE key = ?"
+
+    def __init__(self, path: str, ttl: Optional[float], name: str = "cdx", label: str = "cache"):
+        self.path = path
+        self.ttl = ttl
+        self.name = name
+        self.label = label
+
+    @staticmethod
+    def scope(query: CDXquery) -> dict:
+        """
+        The normalized query - which url (case and `www.` as the cdx server ignores them),
+        whether below it, which timestamps (padded to 14 digits), limit and filters.
+        """
+        stem = query.target.lower()
+        stem = stem[4:] if stem.startswith("www.") else stem
+        first, last = query.period
+        return {
+            "stem": stem if "/" in stem else f"{stem}/",
+            "wildcard": not query.explicit,
+            "first": (first or "").ljust(14, "0"),
+            "last": (last or "").ljust(14, "9"),
+            "limit": str(query.limit) if query.limit else None,
+            "filetype": sorted({filetype.lower() for filetype in query.filter_filetype or []}),
+            "statuscode": sorted(set(query.filter_statuscode or [])),
+        }
+
+    @staticmethod
+    def _covers(stored: dict, wanted: dict) -> bool:
+        """
+        Whether every row of the `wanted` query is in the result of the `stored` one.
+        """
+        if stored["limit"] or stored["first"] > wanted["first"] or stored["last"] < wanted["last"]:
+            return False
+        for column in ("filetype", "statuscode"):
+            if stored[column] and not (wanted[column] and set(wanted[column]) <= set(stored[column])):
+                return False
+        if not stored["wildcard"]:
+            return not wanted["wildcard"] and wanted["stem"] == stored["stem"]
+        below = stored["stem"].rstrip("/") + "/"
+        return (wanted["stem"] + ("/" if wanted["wildcard"] else "")).startswith(below)
+
+    @staticmethod
+    def _matcher(wanted: dict):
+        """
+        A filter over the parsed rows of a cdx result, selecting those of the `wanted` query.
+        """
+        below = wanted["stem"].rstrip("/") + "/"
+        filetype = re.compile(rf".*\.({'|'.join(map(re.escape, wanted['filetype']))})$")
+        statuscode = re.compile(rf"({'|'.join(map(re.escape, wanted['statuscode']))})$")
+
+        def match(row: list) -> bool:
+            timestamp, original = row[0], row[4]
+            if not wanted["first"] <= timestamp <= wanted["last"]:
+                return False
+            url = original.split("://", 1)[-1]
+            host, _, path = url.partition("/")
+            host = host.split("@")[-1].split(":")[0].lower()
+            host = host[4:] if host.startswith("www.") else host
+            url = f"{host}/{path}".lower()
+            if not (url.startswith(below) if wanted["wildcard"] else url == wanted["stem"]):
+                return False
+            if wanted["filetype"] and not filetype.match(original):
+                return False
+            return not wanted["statuscode"] or bool(statuscode.match(row[3]))
+
+        return match
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.join(self.path, self.name), exist_ok=True)
+        connection = sqlite3.connect(os.path.join(self.path, f"{self.name}.db"), timeout=30, isolation_level=None)
+        connection.execute(self._SQL_CREATE)
+        return connection
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, self.name, name)
+
+    def answer(self, query: CDXquery, filepath: str) -> bool:
+        """
+        Write the result of the query to `filepath` from a stored result, if one covers it.
+
+        Returns:
+            bool: True if the query was answered from the cache.
+        """
+        wanted = self.scope(query)
+        key = json.dumps(wanted, sort_keys=True)
+        connection = self._connect()
+        try:
+            oldest = 0 if self.ttl is None else time.time() - self.ttl * 86400
+            for expired, name in connection.execute(self._SQL_EXPIRED, (oldest,)).fetchall():
+                connection.execute(self._SQL_DELETE, (expired,))
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            found = connection.execute(self._SQL_FIND, (wanted["stem"].split("/")[0], oldest)).fetchall()
+        finally:
+            connection.close()
+        # the same query first, otherwise the smallest result which covers it
+        candidates = sorted(
+            (stored != key, os.path.getsize(self._file(name)), stored, name)
+            for stored, name in found
+            if os.path.exists(self._file(name)) and (stored == key or self._covers(json.loads(stored), wanted))
+        )
+        if not candidates:
+            return False
+        _, _, stored, name = candidates[0]
+        if stored == key:
+            shutil.copyfile(self._file(name), filepath)
+            vb.write(content=f"\nCDX result taken from the {self.label}")
+            return True
+
+        match = self._matcher(wanted)
+        limit = int(wanted["limit"]) if wanted["limit"] and wanted["limit"].isdigit() else None
+        rows = []
+        with open(self._file(name), "r", encoding="utf-8") as source:
+            header = source.readline().strip().rstrip(",")
+            for line in source:
+                line = line.strip()
+                if line.endswith("]]"):
+                    line = line.rsplit("]", 1)[0]
+                if line.endswith(","):
+                    line = line.rsplit(",", 1)[0]
+                try:
+                    row = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    continue
+                if match(row):
+                    rows.append(line)
+                    if limit and len(rows) >= limit:
+                        break
+        with open(filepath, "w", encoding="utf-8") as target:
+            target.write(f"{header},\n" + ",\n".join(rows) + "]\n" if rows else "[]\n")
+        vb.write(content=f"\nCDX result taken from the {self.label} - {len(rows)} snapshots of a broader query")
+        return True
+
+    def store(self, query: CDXquery, filepath: str):
+        """
+        Store the result of the query, written to `filepath`.
+        """
+        scope = self.scope(query)
+        key = json.dumps(scope, sort_keys=True)
+        name = hashlib.sha1(key.encode()).hexdigest() + ".cdx"
+        connection = self._connect()
+        try:
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+            try:
+                os.link(filepath, self._file(name))  # the job file is not written again
+            except OSError:
+                shutil.copyfile(filepath, self._file(name))
+            connection.execute(self._SQL_STORE, (key, scope["stem"].split("/")[0], name, time.time()))
+        finally:
+            connection.close()
+
+
 class CSVfile(File):
+    """
+    Result file of the job, one row per handled snapshot.
+
+    Written as an append-only journal while the job runs (`append`), so the
+    shutdown does not depend on the job size and a killed job loses at most
+    one unflushed batch. `store_result` rewrites the whole file from the
+    database on demand. On resume the rows are read in order, so a later row
+    for the same snapshot wins.
+    """
+
+    COLUMNS = ("timestamp", "url_archive", "url_origin", "redirect_url", "redirect_timestamp", "response", "file")
+
+    # rows buffered before they are written and flushed to disk
+    JOURNAL_BATCHSIZE = 250
+
     def __init__(self, filepath: str):
         super().__init__(filepath=filepath)
+        self._journal_handler = None
+        self._journal_writer = None
+        self._journal_buffer = []
+        self._journal_lock = threading.Lock()
 
     def __iter__(self):
         self._open(mode="r")
@@ -176,20 +403,54 @@ class CSVfile(File):
         else:
             self._file_writer.writerows(rows)
 
+    def append(self, row: list):
+        """
+        Append a result row (by `COLUMNS`) to the journal. Thread-safe.
+
+        Rows are buffered and written in batches of `JOURNAL_BATCHSIZE`.
+        """
+        with self._journal_lock:
+            self._journal_buffer.append(row)
+            if len(self._journal_buffer) >= self.JOURNAL_BATCHSIZE:
+                self._flush_journal()
+
+    def flush(self):
+        """
+        Write buffered journal rows and close the journal.
+        """
+        with self._journal_lock:
+            self._flush_journal()
+            if self._journal_handler:
+                self._journal_handler.close()
+            self._journal_handler = None
+            self._journal_writer = None
+
+    def _flush_journal(self):
+        if not self._journal_buffer:
+            return
+        if not self._journal_handler:
+            self._journal_handler = open(self.filepath, "a", encoding="utf-8", newline="")
+            self._journal_writer = csv.writer(self._journal_handler)
+            if self._journal_handler.tell() == 0:
+                self._journal_writer.writerow(self.COLUMNS)
+        self._journal_writer.writerows(self._journal_buffer)
+        self._journal_handler.flush()
+        self._journal_buffer = []
+
     def store_result(self):
         """
-        Store all processed snapshots from the database to the CSV file.
+        Rewrite the CSV file with all processed snapshots from the database.
+
+        Compacts the journal into one row per snapshot and adds the snapshots
+        skipped by their cdx statuscode. Read through the row view, so the csv
+        keeps its columns although url_archive is derived and origin and
+        timestamp are stored compact.
         """
+        self.flush()
         db = Database()
-        stmt = select(
-            waybackup_snapshots.timestamp,
-            waybackup_snapshots.url_archive,
-            waybackup_snapshots.url_origin,
-            waybackup_snapshots.redirect_url,
-            waybackup_snapshots.redirect_timestamp,
-            waybackup_snapshots.response,
-            waybackup_snapshots.file,
-        ).where(waybackup_snapshots.response.is_not(None))
+        stmt = select(*(waybackup_snapshot_rows.c[column] for column in self.COLUMNS)).where(
+            waybackup_snapshot_rows.c.response.is_not(None)
+        )
         result = db.session.execute(statement=stmt)
         row_batchsize = 2500
         with self as f:
@@ -200,3 +461,113 @@ class CSVfile(File):
                     break
                 f.write_rows(rows)
         db.close()
+
+
+class ManifestFile(CSVfile):
+    """
+    Files a `--sync` run added or changed in the output, one row per file.
+
+    Started over by every run which queries new captures and written as a
+    journal like the csv, so a resumed run continues the manifest of the
+    interrupted one. Consumers of the backup only pick up these files.
+    """
+
+    COLUMNS = ("change", "timestamp", "url_archive", "url_origin", "file")
+
+    def counts(self) -> dict:
+        """
+        dict: Number of files per change ('added', 'changed').
+        """
+        self.flush()
+        counts = {"added": 0, "changed": 0}
+        if not self.file:
+            return counts
+        with self as f:
+            for row in f:
+                counts[row["change"]] = counts.get(row["change"], 0) + 1
+        return counts
+
+
+class InputFile(File):
+    """
+    Captures to download instead of the result of a cdx query (`--input`).
+
+    Read from a file or from stdin (`-`), one capture per line. The format is
+    detected by the first line:
+
+    - jsonl: an object per line with `url_archive`, or `timestamp` and `url_origin` (or `original`)
+    - csv: a header with the same columns, e.g. the csv of an earlier job
+    - plain text: an archive url, or a timestamp and the original url separated by whitespace
+
+    Lines which are no capture are counted as `faulty` and skipped.
+    """
+
+    _ARCHIVE = re.compile(r"^(?:https?://)?web\.archive\.org/web/(\d{1,14})[a-z_]*/(.+)$")
+
+    def __init__(self, filepath: str):
+        super().__init__(filepath=filepath)
+        self.faulty = 0
+
+    @classmethod
+    def _capture(cls, url_archive: str = None, timestamp: str = None, url_origin: str = None):
+        if url_archive:
+            match = cls._ARCHIVE.match(url_archive.strip())
+            if not match:
+                return None
+            timestamp, url_origin = match.groups()
+        timestamp = str(timestamp or "").strip()
+        url_origin = (url_origin or "").strip()
+        if not timestamp.isdigit() or len(timestamp) > 14 or not url_origin:
+            return None
+        return int(timestamp.ljust(14, "0")), url_origin
+
+    def _rows(self, lines):
+        first = next(lines, None)
+        while first is not None and not first.strip():
+            first = next(lines, None)
+        if first is None:
+            return
+        lines = itertools.chain([first], lines)
+        if first.lstrip().startswith("{"):
+            for line in lines:
+                try:
+                    row = json.loads(line) if line.strip() else None
+                except json.decoder.JSONDecodeError:
+                    row = None
+                if isinstance(row, dict):
+                    yield row.get("url_archive"), row.get("timestamp"), row.get("url_origin") or row.get("original")
+                elif line.strip():
+                    yield None, None, None
+        elif {"url_archive", "timestamp"} & {column.strip() for column in first.split(",")}:
+            for row in csv.DictReader(lines):
+                yield row.get("url_archive"), row.get("timestamp"), row.get("url_origin") or row.get("original")
+        else:
+            for line in lines:
+                fields = line.split()
+                if len(fields) == 1:
+                    yield fields[0], None, None
+                elif len(fields) == 2:
+                    yield None, fields[0], fields[1]
+                elif fields:
+                    yield None, None, None
+
+    def captures(self) -> list:
+        """
+        list: (timestamp, url_origin) of the captures in the given order, a short timestamp padded to 14 digits.
+        """
+        captures = []
+        if self.filepath == "-":
+            rows = self._rows(iter(sys.stdin))
+        else:
+            self._open(mode="r")
+            rows = self._rows(iter(self._file_handler))
+        try:
+            for url_archive, timestamp, url_origin in rows:
+                capture = self._capture(url_archive, timestamp, url_origin)
+                if capture is None:
+                    self.faulty += 1
+                else:
+                    captures.append(capture)
+        finally:
+            self._close()
+        return captures
@@ -8,6 +8,15 @@ _mime = magic.Magic(mime=True)
 # only keep the header for libmagic
 _MIME_SNIFF_BYTES = 2048
 
+# output path plans, decided per snapshot before the download (see plan_output)
+PLAN_FILE = 1  # written to its path as is
+PLAN_HTML = 2  # html without extension, written with `.html` appended
+PLAN_INDEX = 3  # path is also a folder, html is written into it as index.html
+PLAN_BASENAME = 4  # path is also a folder, the file is written into it under its own name
+
+# cdx mimetypes which do not tell whether the content is html
+_MIME_UNDECIDED = {"", "unk", "warc/revisit", "application/octet-stream", "application/xhtml+xml"}
+
 
 def check_nt():
     """
@@ -16,6 +25,17 @@ def check_nt():
     return os.name == "nt"
 
 
+def cache_dir() -> str:
+    """
+    Default directory of the caches shared by all jobs.
+
+    `pywaybackup` in the user cache directory - `%LOCALAPPDATA%` on windows,
+    `$XDG_CACHE_HOME` or `~/.cache` elsewhere.
+    """
+    base = os.environ.get("LOCALAPPDATA") if check_nt() else os.environ.get("XDG_CACHE_HOME")
+    return os.path.join(base or os.path.join(os.path.expanduser("~"), ".cache"), "pywaybackup")
+
+
 def sanitize_filename(filename: str) -> str:
     """
     Sanitize a string to be used as (part of) a filename.
@@ -53,7 +73,7 @@ def url_get_timestamp(url):
     return timestamp
 
 
-def move_index(existpath: str = None, existfile: str = None, filebuffer: bytes = None):
+def move_index(existpath: str = None, existfile: str = None, filebuffer: bytes = None, mimetypes: tuple = ()):
     """
     1. If existpath is given but can't be created because a file exists with the same name
         - moves the existing file to a temporary name
@@ -64,6 +84,7 @@ def move_index(existpath: str = None, existfile: str = None, filebuffer: bytes =
     2. If existfile is given but can't be created because a folder exists with the same name
         - sets existfile path to existing folder + index.html
         - if the new file is text/html, stores it as index.html, else as basename of target folder
+        - `mimetypes` of the new file are used as in `check_index_mime`
     """
     if existpath:
         shutil.move(existpath, existpath + "_exist")
@@ -75,30 +96,98 @@ def move_index(existpath: str = None, existfile: str = None, filebuffer: bytes =
         shutil.move(existpath + "_exist", new_file)
     elif existfile:
         if filebuffer:
-            if not check_index_mime(filebuffer):
+            if not check_index_mime(filebuffer, mimetypes):
                 return os.path.join(existfile, os.path.basename(os.path.normpath(existfile)))
             else:
                 return os.path.join(existfile, "index.html")
 
 
-def check_index_mime(filebuffer: bytes) -> bool:
+def mime_hint(mimetype: str):
+    """
+    Reduce a cdx mimetype or a Content-Type header to the bare type.
+
+    Returns None if it does not tell the type of the content (see `_MIME_UNDECIDED`).
+    """
+    if not mimetype:
+        return None
+    mimetype = mimetype.split(";")[0].strip().lower()
+    if mimetype in _MIME_UNDECIDED:
+        return None
+    return mimetype
+
+
+def check_index_mime(filebuffer: bytes, mimetypes: tuple = ()) -> bool:
+    """
+    Check if the content of a snapshot is html.
+
+    `mimetypes` are hints on the content, the cdx mimetype and the Content-Type
+    of the response. If they tell and agree they decide, libmagic is only asked
+    if they are unknown or disagree - a sniff per file is the expensive part of
+    html-heavy jobs.
+    """
+    hints = {mime_hint(mimetype) for mimetype in mimetypes} - {None}
+    if len(hints) == 1:
+        return hints.pop() == "text/html"
     mime_type = _mime.from_buffer(filebuffer[:_MIME_SNIFF_BYTES])
     if mime_type != "text/html":
         return False
     return True
 
 
-def add_html_extension(filepath: str, filebuffer: bytes) -> str:
+def add_html_extension(filepath: str, filebuffer: bytes, mimetypes: tuple = ()) -> str:
     """
     Append `.html` to a file without extension if its content is html.
 
     Urls like `/about` or `/docs/guide` carry no extension, so the snapshot is
     written as an extensionless file that no browser or file manager opens.
-    The content type is sniffed from the buffer instead of the cdx mimetype
-    column, which is often `warc/revisit` or `unk` rather than a real type.
+    The cdx mimetype is often `warc/revisit` or `unk` rather than a real type,
+    so the content is sniffed unless the `mimetypes` hints agree (see `check_index_mime`).
     """
     if os.path.splitext(filepath)[1]:
         return filepath
-    if not check_index_mime(filebuffer):
+    if not check_index_mime(filebuffer, mimetypes):
         return filepath
     return filepath + ".html"
+
+
+def plan_output(filepath: str, folder: bool, mimetype: str = None):
+    """
+    Decide how a snapshot is written to its output path, without its content.
+
+    Returns the same choice `add_html_extension` and `move_index` make at write
+    time, decided from the cdx mimetype and whether another snapshot needs the
+    path as a folder. Returns None if the mimetype does not tell (e.g.
+    `warc/revisit`) and the content has to be sniffed after the download.
+
+    Args:
+        filepath (str): Output path built from the url key.
+        folder (bool): Another snapshot is written below this path.
+        mimetype (str, optional): Mimetype reported by the cdx.
+    """
+    extension = os.path.splitext(filepath)[1]
+    if not folder and extension:
+        return PLAN_FILE
+    mimetype = mime_hint(mimetype)
+    if mimetype is None:
+        return None
+    html = mimetype == "text/html"
+    if html and not extension:
+        return PLAN_HTML
+    if not folder:
+        return PLAN_FILE
+    return PLAN_INDEX if html else PLAN_BASENAME
+
+
+def apply_plan(filepath: str, plan: int = None) -> str:
+    """
+    Build the final output file from the path of a snapshot and its plan (see `plan_output`).
+
+    An unplanned path is returned unchanged.
+    """
+    if plan == PLAN_HTML:
+        return filepath + ".html"
+    if plan == PLAN_INDEX:
+        return os.path.join(filepath, "index.html")
+    if plan == PLAN_BASENAME:
+        return os.path.join(filepath, os.path.basename(filepath))
+    return filepath
@@ -62,10 +62,10 @@ class Interactive:
         label = action.help
         if action.nargs == 0:  # store_true
             return self._prompt_yes_no(label, default=bool(current))
-        if action.type is int:
+        if action.type in (int, float):
             if current is None:
                 return self._prompt_optional_int(label)
-            return self._prompt_int(label, default=current)
+            return self._prompt_int(label, default=current, kind=action.type)
         if current is None:
             return self._prompt_optional_str(label)
         return self._prompt_str(label, default=current)
@@ -100,15 +100,15 @@ class Interactive:
                 print("  (please enter an integer or leave blank)")
 
     @staticmethod
-    def _prompt_int(label, default):
+    def _prompt_int(label, default, kind=int):
         while True:
             value = input(f"{label} [{default}]: ").strip()
             if not value:
                 return default
             try:
-                return int(value)
+                return kind(value)
             except ValueError:
-                print("  (please enter an integer)")
+                print("  (please enter an integer)" if kind is int else "  (please enter a number)")
 
     @staticmethod
     def _prompt_yes_no(label, default):
@@ -2,6 +2,7 @@ import signal
 import sys
 
 from pywaybackup import PyWayBackup
+from pywaybackup.Batch import Batch
 from pywaybackup.arguments import Arguments
 from pywaybackup.interactive import Interactive
 
@@ -17,9 +18,12 @@ def cli():
         print("\nAborted.")
         sys.exit(130)
     cli_args = cli_input.get_args()
-    config = PyWayBackup(**cli_args)
     try:
-        config.run(daemon=False)
+        if cli_args.get("batch"):
+            Batch(jobs=Batch.read(cli_args["batch"]), defaults=cli_args, turn=cli_args["batch_turn"]).run()
+        else:
+            config = PyWayBackup(**cli_args)
+            config.run(daemon=False)
     finally:
         if interactive:
             try:
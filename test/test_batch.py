@@ -0,0 +1,55 @@
+import os
+import signal
+
+import pytest
+
+from pywaybackup.Batch import Batch
+from pywaybackup.PyWayBackup import PyWayBackup
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    """
+    Jobs without a cdx query (no snapshots) - only their setup against the job database is run.
+    """
+    monkeypatch.setattr(PyWayBackup, "_prep_cdx", lambda self: False)
+    handler = signal.getsignal(signal.SIGINT)
+    yield
+    signal.signal(signal.SIGINT, handler)  # the jobs ignore it once they are done
+
+
+def _job(tmp_path, url, **arguments) -> dict:
+    output = os.path.join(tmp_path, url)
+    os.makedirs(output, exist_ok=True)
+    return {"url": url, "output": output, "cache": str(tmp_path), "keep": True, **arguments}
+
+
+def test_new_job_after_resumed_job(tmp_path, capsys):
+    resumed = _job(tmp_path, "a.com", last=True)
+    PyWayBackup(**resumed).run()
+    new = _job(tmp_path, "b.com", last=True, sync=True)
+    capsys.readouterr()
+
+    Batch([resumed, new], defaults={"silent": False}).run()
+
+    out = capsys.readouterr().out
+    assert out.count("DOWNLOAD job exist") == 1  # a.com only
+    manifest = os.path.join(new["output"], "waybackup_b.com.manifest.csv")
+    with open(manifest, encoding="utf-8") as f:
+        assert f.readline().startswith("change,")
+
+
+def test_resumed_job_after_replaced_selection(tmp_path):
+    replaced = _job(tmp_path, "a.com", first=True)
+    PyWayBackup(**replaced).run()
+    replaced = {**replaced, "first": False, "last": True}  # drops the selection of the first run
+    resumed = _job(tmp_path, "b.com", last=True)
+    PyWayBackup(**resumed).run()
+    cdxfile = os.path.join(resumed["output"], "waybackup_b.com.cdx")
+    with open(cdxfile, "w", encoding="utf-8") as f:
+        f.write("listing of b.com\n")
+
+    Batch([replaced, resumed]).run()
+
+    with open(cdxfile, encoding="utf-8") as f:
+        assert f.read() == "listing of b.com\n"